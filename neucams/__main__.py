@@ -1,8 +1,5 @@
 import sys
 from argparse import ArgumentParser
-from PyQt5.QtWidgets import QApplication
-from neucams.view.widgets import PyCamsWindow
-from neucams.view.launcher import SplashWindow
 from neucams.utils import get_preferences, display
 
 def main():
@@ -10,8 +7,23 @@ def main():
     parser.add_argument('-p','--pref',metavar='preference',
                         type=str,help='Preference filename',default = None)
     parser.add_argument('--verbose', action='store_true', help='Enable verbose logging')
+    parser.add_argument('--headless', action='store_true',
+                        help='No GUI, the cameras are controlled over UDP (needs --pref)')
+    parser.add_argument('--no-record', action='store_true', help='Headless: do not save the frames on start')
     args = parser.parse_args()
 
+    if args.headless:
+        # no Qt import at all
+        if not args.pref:
+            parser.error('--headless needs a preference file (-p)')
+        from neucams.daemon import run
+        run(args.pref, record=not args.no_record)
+        return
+
+    from PyQt5.QtWidgets import QApplication
+    from neucams.view.widgets import PyCamsWindow
+    from neucams.view.launcher import SplashWindow
+
     app = QApplication(sys.argv)
     if args.pref:
         ret, prefs = get_preferences(args.pref)
@@ -27,4 +39,4 @@ def main():
 if __name__ == '__main__':
     import multiprocessing
     multiprocessing.freeze_support()
-    main()
\ No newline at end of file
+    main()
@@ -1,16 +1,29 @@
-from multiprocessing import Process,Queue,Event,Array,Value
+from multiprocessing import Process,Queue,Event,Array,Value,Pipe
 import queue
 import numpy as np
+import cv2
 import ctypes
 import time
 import datetime
+import os
 from os.path import dirname, join
 import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from neucams.file_writer import BinaryWriter, TiffWriter, FFMPEGWriter, OpenCVWriter
-from neucams.utils import display, resolve_cam_id_by_serial
+from neucams.frame_ring import FrameRing
+from neucams.hooks import load_hooks
+from neucams.rois import ROITraces
+from neucams.utils import (display, resolve_cam_id_by_serial, format_cache_key,
+                           get_cached_format, cache_format, sidecar_path)
 from importlib import import_module
 
 
+# shared state of one stream ring: its FrameRef, per slot metadata and the
+# released / dropped frame counters
+StreamChannel = namedtuple('StreamChannel', ['ref', 'meta', 'released', 'dropped'])
+
+
 def clear_queue(my_queue):
     while True:
         try:
@@ -24,6 +37,9 @@ class CameraFactory:
         'avt': ('cams.avt_cam', 'AVTCam'),
         'genicam': ('cams.genicam', 'GenICam'),
         'hamamatsu': ('cams.hamamatsu_cam', 'HamamatsuCam'),
+        'opencv': ('cams.opencv_cam', 'OpenCVCam'),
+        'sim': ('cams.sim_cam', 'SimCam'),
+        'replay': ('cams.replay_cam', 'ReplayCam'),
     }
 
     @staticmethod
@@ -41,6 +57,52 @@ class CameraFactory:
 
 
 
+def _init_cam_group(cams, prefs, on_ready=None):
+    """Builds the handlers of cams one after the other, on_ready(cam, handler, seconds)
+    is called as each one completes. Returns [(cam, handler)]"""
+    out = []
+    for cam in cams:
+        t = time.perf_counter()
+        writer_dict = {**prefs.get('recorder_params', {}), **cam.get('recorder_params', {})}
+        try:
+            cam_handler = CameraHandler(cam, writer_dict)
+        except Exception as e:
+            display(f"Could not initialise camera '{cam.get('description', '?')}': {e}", level='error')
+            cam_handler = None
+        if on_ready is not None:
+            on_ready(cam, cam_handler, time.perf_counter() - t)
+        out.append((cam, cam_handler))
+    return out
+
+
+def init_cam_handlers(cams, prefs, on_ready=None):
+    """Builds the CameraHandlers of cams (not started), returns [(cam, handler)] of the
+    connected cameras in the config order.
+    Cameras of different SDKs are initialised concurrently; cameras of the same SDK
+    share a worker unless prefs 'parallel_init' is 'camera' (the SDK must be thread safe)."""
+    if prefs.get('parallel_init', 'driver') == 'camera':
+        groups = [[cam] for cam in cams]
+    else:
+        groups = {}
+        for cam in cams:
+            groups.setdefault(cam['driver'].lower(), []).append(cam)
+        groups = list(groups.values())
+    t = time.perf_counter()
+    done = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(groups))) as pool:
+        futures = [pool.submit(_init_cam_group, group, prefs, on_ready) for group in groups]
+        for future in as_completed(futures):
+            for cam, cam_handler in future.result():
+                done[id(cam)] = cam_handler
+    display(f"Initialised {len(cams)} camera(s) in {time.perf_counter() - t:.2f} s")
+    cam_handlers = []
+    for cam in cams:
+        cam_handler = done.get(id(cam))
+        if cam_handler is not None and cam_handler.camera_connected:
+            cam_handlers.append((cam, cam_handler))
+    return cam_handlers
+
+
 class CameraHandler(Process):
     
     def __init__(self, cam_dict, writer_dict):
@@ -72,52 +134,126 @@ class CameraHandler(Process):
         self.frame_nr = 0
         
         self.total_frames = Value('i', 0)
+        # the shared frame is a preview for the viewer: decimated to fit preview_size
+        # (set by the viewer from its widget size, 0 is full resolution) at most preview_rate Hz
+        self.preview_size = Array('i', [0, 0])
+        self.preview_frames = Value('i', 0)
+        self.preview_rate = float(cam_dict.get('preview_rate', 60.))
+        self.preview_mode = cam_dict.get('preview_mode', 'stride')  # stride | area
+        self._last_preview = 0.
+        # one byte per new preview, at most one pending until the viewer calls ack_preview
+        self.preview_ready_conn, self._preview_notify_conn = Pipe(duplex=False)
+        self.preview_notified = Event()
         
         self.lastframeid = -1
         self.last_timestamp = 0
+        self.last_timestamp_wall = time.time()
+        self._last_frame_time = time.monotonic()
+        self._gap = None          # (wall time of the last frame, its id) while the camera is lost
+        self.n_recoveries = 0
+        self._watchdog = None     # timeout of the current run, see _watchdog_timeout
+        self._lost_params = {}
         
+        # full rate streams for other processes (neucams.session, neucams.tracking), see enable_stream
+        self.stream_channels = []
+        self._stream_rings = []
+        self.hooks = []  # user per-frame processing (neucams.hooks), loaded in run()
+        self.rois = None  # ROI traces (neucams.rois), loaded in run()
+        self._run_filepath = None
+
+        self._resolved_cam_id = None
+        self.format_cached = False
+        # seconds spent in each init step, shown by the launcher
+        self.init_times = {}
+        # the device is only opened for acquisition in run(), here the format
+        # is probed without streaming (or taken from the format cache)
+        t = time.perf_counter()
         cam = self._open_cam()
+        self.init_times['open'] = time.perf_counter() - t
+        t = time.perf_counter()
         self.camera_connected = cam.is_connected()
+        self.init_times['connect'] = time.perf_counter() - t
         if not self.camera_connected:
             display(f"Camera '{self.cam_dict.get('description', 'unknown')}' (name: '{self.cam_dict.get('name', 'unknown')}') not found or not connected. Please check the connection and close other processes which use the camera.", level='error')
+        else:
+            t = time.perf_counter()
+            self._init_framebuffer(cam)
+            self.init_times['format'] = time.perf_counter() - t
         cam.close()
-        
-        if self.camera_connected:
-            self._init_framebuffer()
-        
 
-    def _init_framebuffer(self):
-        with self._open_cam() as cam:
-            dtype  = cam.format.get('dtype', None)
-            height = cam.format.get('height', None)
-            width  = cam.format.get('width', None)
-            n_chan = cam.format.get('n_chan', 1)
-
-            dtype = np.dtype(dtype) if dtype is not None else None
-
-            if dtype == np.dtype(np.uint8):
-                cdtype = ctypes.c_ubyte
-            elif dtype == np.dtype(np.uint16):
-                cdtype = ctypes.c_ushort
-            else:
-                display(f"WARNING: dtype {dtype} not available, defaulting to np.uint16")
-                cdtype = ctypes.c_ushort
-                dtype = np.dtype(np.uint16)
-
-            if (dtype is None) or (height is None) or (width is None):
-                display("ERROR: format (height, width, dtype[,n_chan]) must be set to init the framebuffer")
-                return False
-
-            self.frame = Array(cdtype, np.zeros([height, width, n_chan], dtype=dtype).ravel())
-            self.format = {'dtype': dtype, 'height': height, 'width': width, 'n_chan': n_chan, 'cdtype': cdtype}
-            self._init_buffer()
-            return True
+    def _probe_format(self, cam=None):
+        if cam is None:
+            cam = self._open_cam()
+        key = format_cache_key(self.cam_dict)
+        fmt = get_cached_format(key) if cam.cache_format else None
+        self.format_cached = fmt is not None
+        if fmt is None:
+            fmt = cam.probe_format()
+            if cam.cache_format and fmt.get('height') and fmt.get('width'):
+                cache_format(key, fmt)
+        return fmt
+
+    def _init_framebuffer(self, cam=None):
+        fmt = self._probe_format(cam)
+        dtype  = fmt.get('dtype', None)
+        height = fmt.get('height', None)
+        width  = fmt.get('width', None)
+        n_chan = fmt.get('n_chan', 1)
+
+        if (dtype is None) or (height is None) or (width is None):
+            display("ERROR: format (height, width, dtype[,n_chan]) must be set to init the framebuffer")
+            return False
+
+        # room for the full sensor so roi/binning changes fit without reallocation
+        max_height = max(fmt.get('max_height', 0), height)
+        max_width  = max(fmt.get('max_width', 0), width)
+
+        dtype = np.dtype(dtype)
+        if dtype == np.dtype(np.uint8):
+            cdtype = ctypes.c_ubyte
+        elif dtype == np.dtype(np.uint16):
+            cdtype = ctypes.c_ushort
+        else:
+            display(f"WARNING: dtype {dtype} not available, defaulting to np.uint16")
+            cdtype = ctypes.c_ushort
+            dtype = np.dtype(np.uint16)
+
+        self.frame = Array(cdtype, max_height * max_width * n_chan)
+        self.frame_shape = Array('i', [height, width, n_chan]) # current layout of self.frame
+        self._full_shape = (height, width)
+        self.full_frame_shape = Array('i', [height, width])  # before decimation
+        self.format = {'dtype': dtype, 'height': height, 'width': width, 'n_chan': n_chan, 'cdtype': cdtype,
+                       'max_height': max_height, 'max_width': max_width}
+        self._init_buffer()
+        return True
+
+    def _check_format(self, cam):
+        """The opened camera may not match a cached format (camera replaced, settings changed on the device)"""
+        if not cam.cache_format:
+            return
+        fmt = cam.format
+        if all(fmt.get(k) in (None, self.format[k]) for k in ('height', 'width', 'max_height', 'max_width')):
+            return
+        display(f"[{cam.name} {cam.cam_id}] format differs from the cached one, updated for the next start.",
+                level='warning')
+        cache_format(format_cache_key(self.cam_dict), {**self.format, **fmt})
 
 
             
     def _init_buffer(self):
+        height, width, n_chan = self.frame_shape[:]
         self.img = np.frombuffer(self.frame.get_obj(), dtype = self.format['cdtype'])\
-                        .reshape([self.format['height'], self.format['width'], self.format['n_chan']])
+                        [:height * width * n_chan].reshape([height, width, n_chan])
+
+    def _resize_buffer(self, shape, frame_shape):
+        """Lays the shared frame buffer out for a new frame format (roi, binning...).
+        Frames larger than the sensor size probed at startup are cropped."""
+        if tuple(shape[:2]) != tuple(frame_shape[:2]):
+            display(f"Frame {frame_shape[:2]} larger than the allocated buffer, the display is cropped.",
+                    level='warning')
+        with self.frame_shape.get_lock():
+            self.frame_shape[:] = list(shape)
+        self._init_buffer()
                         
     def run(self):
         
@@ -129,23 +265,32 @@ class CameraHandler(Process):
                 return   
               
         self._init_buffer()
-        with self._open_cam() as cam:
-            self.cam = cam
+        self._stream_rings = [(FrameRing.from_ref(channel.ref), channel) for channel in self.stream_channels]
+        self.hooks = load_hooks(self.cam_dict)
+        self.rois = ROITraces(self.cam_dict)
+        # not a with block: the watchdog may replace self.cam with a re-opened camera
+        self.cam = self._open_cam().__enter__()
+        try:
+            self._check_format(self.cam)
             with self._open_writer() as writer:
                 self.writer = writer
                 while not self.close_event.is_set():
+                    if self.cam is None and not self._reopen_cam(until=self.close_event):
+                        break  # closed while the camera was lost
                     self._process_queues()
                     self.init_run()
                     
-                    display(f'[{cam.name} {cam.cam_id}] waiting for trigger.')
+                    display(f'[{self.cam.name} {self.cam.cam_id}] waiting for trigger.')
                     self.wait_for_trigger()
                     if self.start_trigger.is_set():
-                        display(f'[{cam.name} {cam.cam_id}] start trigger set.')
+                        display(f'[{self.cam.name} {self.cam.cam_id}] start trigger set.')
                         if self.saving.is_set():
-                            display(f'[{cam.name} {cam.cam_id}] filepath: {self.get_filepath()}')
+                            display(f'[{self.cam.name} {self.cam.cam_id}] filepath: {self.get_filepath()}')
+                    self._last_frame_time = time.monotonic()
                     while not self.stop_trigger.is_set():
                         self._process_queues()
-                        frame, metadata = cam.image()
+                        frame, metadata = self.cam.image()
+                        t_arrival = time.perf_counter()  # reference for the ROI packet latency
                         # Handle shared memory tuple from AVT
                         if isinstance(frame, tuple) and len(frame) == 3 and isinstance(frame[0], str):
                             shm_name, shape, dtype = frame
@@ -155,14 +300,128 @@ class CameraHandler(Process):
                             shm.unlink()
                         # Remove type/shape debug prints
                         if frame is not None:
+                            self._last_frame_time = time.monotonic()
+                            if self.rois:
+                                # first thing after the frame: threshold packets go out with the least latency
+                                self.rois.process(frame, metadata, self._run_filepath if self.saving.is_set() else None,
+                                                  t_arrival=t_arrival)
+                            if self._gap is not None:
+                                self._log_gap(metadata)
                             if self.saving.is_set():
                                 writer.save(frame, metadata)
+                            for hook in self.hooks:
+                                hook.push(frame, metadata)
                             self._update(frame,metadata)
                         elif metadata == "stop":
                             self.stop_trigger.set()
-                    display(f'[{cam.name} {cam.cam_id}] stop trigger set.')
+                        elif self._is_stalled():
+                            self._recover()
+                            if self.cam is None:
+                                break  # stopped before the camera came back, retried before the next run
+                    display(f'[{self.cam_dict.get("description", "")}] stop trigger set.')
                     self.close_run()
+        finally:
+            if self.cam is not None:
+                self.cam.__exit__(None, None, None)
+            for ring, _ in self._stream_rings:
+                ring.close()
+            self._stream_rings = []
+            for hook in self.hooks:
+                hook.close()
+            if self.rois is not None:
+                self.rois.close()
         self.handler_closed.set()
+
+    # ------------------------------------------------------------------
+    # watchdog: re-open a camera that stopped delivering frames
+    # ------------------------------------------------------------------
+    def _watchdog_timeout(self):
+        """Seconds without frames before the camera is re-opened, 0 disables.
+        cam_dict 'watchdog_timeout' (default 3 s, at least 3 frame periods);
+        off by default when the camera reports it is triggered (it can wait for triggers).
+        Evaluated once per run, after a re-open and after params changes."""
+        timeout = self.cam_dict.get('watchdog_timeout', None)
+        if timeout is None:
+            timeout = 0 if self.cam.is_triggered() else 3.
+        frame_rate = self.cam.params.get('frame_rate', 0) or 0
+        if timeout and frame_rate > 0:
+            timeout = max(timeout, 3. / frame_rate)
+        return timeout
+
+    def _is_stalled(self):
+        if self._watchdog is None:
+            self._watchdog = self._watchdog_timeout()
+        timeout = self._watchdog
+        return timeout > 0 and time.monotonic() - self._last_frame_time > timeout
+
+    def _recover(self):
+        """Re-opens the camera through the device registry with the current params.
+        Frames are written to a new segment of the run and the gap is logged on the next frame."""
+        display(f"[{self.cam.name} {self.cam.cam_id}] no frames for "
+                f"{time.monotonic() - self._last_frame_time:.1f} s, re-opening the camera.", level='warning')
+        if self._gap is None:
+            self._gap = (self.last_timestamp_wall, self.lastframeid)
+        self._lost_params = dict(self.cam.params)
+        try:
+            self.cam.__exit__(None, None, None)
+        except Exception as e:
+            display(f"[{self.cam.name} {self.cam.cam_id}] error closing the camera: {e}", level='warning')
+        self.cam = None
+        if not self._reopen_cam(until=self.stop_trigger):
+            return
+        if self.saving.is_set():
+            self.writer.set_filepath(self.get_filepath())  # next segment, same run
+        self._last_frame_time = time.monotonic()
+
+    def _reopen_cam(self, until):
+        """Retries opening the camera with backoff until it works or until/close_event is set"""
+        from neucams.cams import registry
+        name = f"[{self.cam_dict.get('description', '')}]"
+        attempt = 0
+        while not until.is_set() and not self.close_event.is_set():
+            # the device list is stale and the id may have changed (GigE address)
+            registry.invalidate(self.cam_dict.get('driver', ''))
+            self._resolved_cam_id = None
+            cam = None
+            try:
+                cam = self._open_cam()
+                cam.params.update(self._lost_params)
+                if cam.is_connected():
+                    self.cam = cam.__enter__()
+                    self._watchdog = None
+                    self.n_recoveries += 1
+                    display(f"{name} camera re-opened.")
+                    return True
+            except Exception as e:
+                display(f"{name} re-open failed: {e}", level='warning')
+            if cam is not None:
+                try:
+                    cam.close()
+                except Exception:
+                    pass
+            attempt += 1
+            until.wait(min(5., 0.25 * 2 ** attempt))
+        return False
+
+    def _log_gap(self, metadata):
+        lost_at, last_id = self._gap
+        self._gap = None
+        resumed_at = time.time()
+        display(f"[{self.cam.name} {self.cam.cam_id}] stream resumed after {resumed_at - lost_at:.3f} s "
+                f"(last frame id {last_id}, new frame id {metadata[0]}).", level='warning')
+        if not self.saving.is_set():
+            return
+        path = sidecar_path(self.get_filepath(), self.cam_dict.get('description', ''), 'gaps')
+        try:
+            new_file = not os.path.isfile(path)
+            os.makedirs(dirname(path), exist_ok=True)
+            with open(path, 'a') as f:
+                if new_file:
+                    f.write("lost_at\tresumed_at\tgap_s\tlast_frame_id\tnext_frame_id\tframes_before\n")
+                f.write(f"{lost_at:.6f}\t{resumed_at:.6f}\t{resumed_at - lost_at:.6f}\t"
+                        f"{last_id}\t{metadata[0]}\t{self.frame_nr}\n")
+        except OSError as e:
+            display(f"Could not write the gap log {path}: {e}", level='warning')
     
     def _open_writer(self):
         writer_type = self.writer_dict.get('recorder', 'opencv')
@@ -211,16 +470,20 @@ class CameraHandler(Process):
         cam_dict_copy = self.cam_dict.copy()
         cam_type = cam_dict_copy.pop('driver', None)
         if cam_type is None:
-            raise ValueError("Camera 'driver' must be specified (avt|genicam|hamamatsu)")
+            raise ValueError(f"Camera 'driver' must be specified ({'|'.join(CameraFactory.cameras)})")
         cam_type = cam_type.lower()
 
         serial_number = cam_dict_copy.get('serial_number', None)
 
         if cam_type == 'hamamatsu':
             cam_id = None  # resolve by serial in the driver
+        elif serial_number is not None:
+            # resolved once, the handler process inherits the id
+            if self._resolved_cam_id is None:
+                self._resolved_cam_id = resolve_cam_id_by_serial(cam_type, serial_number)
+            cam_id = self._resolved_cam_id
         else:
-            cam_id = (resolve_cam_id_by_serial(cam_type, serial_number)
-                    if serial_number is not None else cam_dict_copy.get('id', None))
+            cam_id = cam_dict_copy.get('id', None)
 
         return CameraFactory.get_camera(
             cam_type,
@@ -231,15 +494,28 @@ class CameraHandler(Process):
 
     
     def get_image(self):
+        if self.img is None or tuple(self.frame_shape[:]) != self.img.shape:
+            self._init_buffer()
         return self.img
     
     def init_run(self):
         self.frame_nr = 0
         self.lastframeid = -1
-        self.writer.set_filepath(self.get_new_filepath())
+        self._run_filepath = self.get_new_filepath()
+        self.writer.set_filepath(self._run_filepath)
+        self._watchdog = None
         self.camera_ready.set()
+        self._notify_preview()  # the viewer refreshes its labels (stopped, next filepath)
     
     def close_run(self):
+        health = self.cam.get_health_status() if self.cam is not None else None
+        for hook in self.hooks:
+            hook.close_run()
+        if self.rois is not None:
+            self.rois.close_run()
+        if health and health.get('overruns'):
+            display(f"[{self.cam.name} {self.cam.cam_id}] {health['overruns']} frames lost to buffer overruns so far.",
+                    level='warning')
         self.start_trigger.clear()
         self.is_acquisition_done.set()
         if self.saving.is_set():
@@ -250,14 +526,99 @@ class CameraHandler(Process):
 
     def _update(self, frame, metadata):
         self._update_buffer(frame)
+        for ring, channel in self._stream_rings:
+            self._publish(ring, channel, frame, metadata)
         self.frame_nr += 1
         self.total_frames.value += 1
         frameID,timestamp = metadata[:2]
         self.lastframeid = frameID
         self.last_timestamp = timestamp
+        self.last_timestamp_wall = time.time()
     
+    # ------------------------------------------------------------------
+    # stream: every frame copied to a shared ring, read in place by one consumer
+    # ------------------------------------------------------------------
+    def enable_stream(self, n_slots=32):
+        """Creates a shared ring the handler publishes every frame to (before start()),
+        one per consumer. Returns (ring, channel), the ring is owned by the caller.
+        Slots have the full sensor size, the metadata of each slot (channel.meta) is
+        (frame_id, timestamp, height, width, n_chan)."""
+        ring = FrameRing(n_slots, (self.format['max_height'], self.format['max_width'],
+                                   self.format.get('n_chan', 1)), self.format['dtype'])
+        # released: frames the consumer is done with; slots from there on are not overwritten
+        channel = StreamChannel(ring.ref(0, 0), Array('d', n_slots * 5, lock=False),
+                                Value('q', 0, lock=False), Value('q', 0, lock=False))
+        self.stream_channels.append(channel)
+        return ring, channel
+
+    def _publish(self, ring, channel, frame, metadata):
+        count = ring.count
+        if count - channel.released.value >= ring.n_slots:
+            # consumer behind or holding every slot: the stream drops, never the camera
+            channel.dropped.value += 1
+            return
+        slot = count % ring.n_slots
+        height, width = min(frame.shape[0], ring.shape[0]), min(frame.shape[1], ring.shape[1])
+        n_chan = frame.shape[2] if frame.ndim == 3 else 1
+        ring.frames[slot, :height, :width] = np.reshape(frame[:height, :width], (height, width, n_chan))
+        channel.meta[slot * 5:(slot + 1) * 5] = [metadata[0], metadata[1], height, width, n_chan]
+        ring.set_count(count + 1)  # published once the frame and its metadata are written
+
     def _update_buffer(self,frame):
-        self.img[:] = np.reshape(frame,self.img.shape)[:]
+        now = time.perf_counter()
+        if self.preview_rate > 0 and now - self._last_preview < 1. / self.preview_rate:
+            return
+        self._last_preview = now
+        if frame.shape[:2] != self._full_shape:
+            self._full_shape = frame.shape[:2]
+            self.full_frame_shape[:] = list(self._full_shape)
+            display(f"[{self.cam_dict.get('description', '')}] frame format changed to "
+                    f"{frame.shape[0]} x {frame.shape[1]}")
+        frame = self._downsample(frame)
+        shape = (min(frame.shape[0], self.format['max_height']),
+                 min(frame.shape[1], self.format['max_width']),
+                 frame.shape[2] if frame.ndim == 3 else 1)
+        if shape != self.img.shape:
+            self._resize_buffer(shape, frame.shape)
+        self.img[:] = np.reshape(frame[:shape[0], :shape[1]], shape)
+        self.preview_frames.value += 1
+        self._notify_preview()
+
+    def _notify_preview(self):
+        """Wakes the viewer: a new preview, or a state change (run over, new filepath)"""
+        if not self.preview_notified.is_set():
+            self.preview_notified.set()
+            self._preview_notify_conn.send_bytes(b'\0')
+
+    def ack_preview(self):
+        """Viewer side, once preview_ready_conn is readable: takes the pending notification.
+        Cleared before reading so a preview written meanwhile sends a new one (at most
+        one extra wake-up, never a lost frame); exactly one byte is read per set."""
+        self.preview_notified.clear()
+        self.preview_ready_conn.recv_bytes()
+
+    def _downsample(self, frame):
+        """Integer decimation so the frame fits preview_size, by striding (a view, no copy)
+        or area averaging"""
+        height, width = self.preview_size[:]
+        if height <= 0 or width <= 0:
+            return frame
+        factor = max(1, -(-frame.shape[0] // height), -(-frame.shape[1] // width))
+        factor = min(factor, frame.shape[0], frame.shape[1])
+        if factor == 1:
+            return frame
+        if self.preview_mode == 'area':
+            out = cv2.resize(frame, (frame.shape[1] // factor, frame.shape[0] // factor),
+                             interpolation=cv2.INTER_AREA)
+            return out if out.ndim == frame.ndim else out[:, :, None]
+        return frame[::factor, ::factor]
+
+    def set_preview_size(self, height, width):
+        """Largest preview the viewer shows, the handler decimates frames to fit (0 for full resolution)"""
+        height, width = int(height), int(width)
+        if (height, width) != tuple(self.preview_size[:]):
+            with self.preview_size.get_lock():
+                self.preview_size[:] = [height, width]
         
     def wait_for_trigger(self):
         while not self.start_trigger.is_set() and not self.stop_trigger.is_set():
@@ -331,6 +692,7 @@ class CameraHandler(Process):
         # If any 'set' commands were processed, apply them in one batch
         if params_to_set:
             self.cam.apply_params()
+            self._watchdog = None  # trigger mode or frame rate may have changed
 
     def set_cam_param(self, param : str, val):
         """Puts a ('set', param, value) command on the input queue."""
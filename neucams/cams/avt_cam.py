@@ -36,8 +36,10 @@ from vmbpy import (
     VmbFeatureError, VmbTimeout,
 )
 
-from .generic_cam import GenericCam
+from .generic_cam import (GenericCam, FORMAT_PARAMS, get_format_params,
+                          sfnc_format_features, clamp_to_range)
 from neucams.utils import display
+from . import registry
 
 
 # ----------------------------------------------------------------------
@@ -68,20 +70,31 @@ def debug_pickle(obj, prefix=''):
                 debug_pickle(obj[k], prefix + f'  {k}: ')
 
 
-def AVT_get_ids():
-    """Return ([ids], [pretty strings]) for all connected Allied Vision cams."""
+def AVT_list_devices(refresh=False):
+    """Enumerates the Allied Vision cams, one VmbSystem session (see registry)."""
     with VmbSystem.get_instance() as vmb:
-        ids, infos = [], []
-        for c in vmb.get_all_cameras():
-            ids.append(c.get_id())
-            infos.append(f"{c.get_model()} {c.get_serial()} {c.get_id()}")
-    return ids, infos
+        return [registry.DeviceInfo('avt', c.get_serial(), c.get_id(), i, c.get_model())
+                for i, c in enumerate(vmb.get_all_cameras())]
+
+
+def AVT_get_ids(refresh=False):
+    """Return ([ids], [pretty strings]) for all connected Allied Vision cams."""
+    devices = registry.list_devices('avt', refresh=refresh)
+    return ([d.id for d in devices],
+            [f"{d.model} {d.serial} {d.id}" for d in devices])
+
+
+def _on_camera_change(cam, event):
+    # hotplug while a VmbSystem session is open: enumerate again on next lookup
+    registry.invalidate('avt')
 
 
 class AVTCam(GenericCam):
     """Allied Vision camera wrapper updated for vmbpy."""
 
     timeout = 2_000  # ms
+    cache_format = True
+    live_params = ("exposure", "gain", "gain_auto")
 
     # ------------------------------------------------------------------
     def __init__(self, cam_id=None, params=None, format=None):
@@ -111,6 +124,7 @@ class AVTCam(GenericCam):
         self.exposed_params = [
             "frame_rate", "gain", "exposure", "gain_auto",
             "triggered", "acquisition_mode", "n_frames",
+            "roi", "binning", "decimation",
         ]
         self.params = {**default_params, **self.params}
 
@@ -122,10 +136,15 @@ class AVTCam(GenericCam):
         self.vimba = None
         self.frame_generator = None
         self.is_recording = False
+        self._format_applied = None
 
     # ------------------------------------------------------------------
     # connection helpers
     # ------------------------------------------------------------------
+    def is_triggered(self):
+        # trigger* defaults are not applied, the camera free-runs unless 'triggered'
+        return bool(self.params.get('triggered', False))
+
     def is_connected(self):
         ids, _ = AVT_get_ids()
         if self.cam_id in ids:
@@ -134,6 +153,24 @@ class AVTCam(GenericCam):
         display(f"Requested AVT cam **not** detected: {self.cam_id}", level="error")
         return False
 
+    def probe_format(self):
+        """Applies the params and reads the format from the features, no streaming."""
+        if not self.is_connected():
+            return dict(self.format)
+        with VmbSystem.get_instance() as vmb:
+            cam = vmb.get_camera_by_id(self.cam_id)
+            with cam:
+                self.cam_handle = cam
+                self._forget_applied_params()
+                try:
+                    self.apply_params()  # reads the format too
+                finally:
+                    self.cam_handle = None
+                    self._format_applied = None
+                    self._forget_applied_params()
+        self.format.setdefault("n_chan", 1)  # Mono8, see apply_params
+        return dict(self.format)
+
     # ------------------------------------------------------------------
     # context management
     # ------------------------------------------------------------------
@@ -143,16 +180,22 @@ class AVTCam(GenericCam):
 
         self.vimba = VmbSystem.get_instance()
         self.vimba.__enter__()
+        try:
+            self.vimba.register_camera_change_handler(_on_camera_change)
+        except Exception:
+            pass
 
-        for cam in self.vimba.get_all_cameras():
-            if cam.get_id() == self.cam_id:
-                self.cam_handle = cam
-                break
+        try:
+            self.cam_handle = self.vimba.get_camera_by_id(self.cam_id)
+        except Exception:
+            self.cam_handle = None
         if self.cam_handle is None:
+            registry.invalidate('avt')
             display(f"Camera {self.cam_id} vanished.", level="error")
             return self
 
         self.cam_handle.__enter__()
+        self._forget_applied_params()
         self.apply_params()
         self._record()
         self._init_format()
@@ -166,6 +209,10 @@ class AVTCam(GenericCam):
                 self.cam_handle.__exit__(exc_type, exc_val, exc_tb)
         finally:
             if self.vimba:
+                try:
+                    self.vimba.unregister_camera_change_handler(_on_camera_change)
+                except Exception:
+                    pass
                 self.vimba.__exit__(exc_type, exc_val, exc_tb)
         return False
 
@@ -173,61 +220,73 @@ class AVTCam(GenericCam):
     # parameter handling
     # ------------------------------------------------------------------
     def apply_params(self):
+        """Writes the params changed since the last call. exposure / gain are set
+        while streaming, anything else stops the acquisition meanwhile."""
         if not self.cam_handle:
             display("apply_params() called before camera opened", level="warning")
             return
-
-        resume_recording = self.is_recording
-        if self.is_recording:
+        changed = self._params_changed()
+        if not changed:
+            return
+        first = not self._applied_params
+        resume_recording = self._needs_restart(changed)
+        if resume_recording:
             self.stop()
 
         p = self.params
         try:
-            # 0) kill autos first
-            for feat, val in [("GainAuto", "Off"), ("ExposureAuto", "Off")]:
-                try: _set(self.cam_handle, feat, val)
-                except Exception: pass
+            if first:
+                # 0) kill autos first
+                for feat, val in [("GainAuto", "Off"), ("ExposureAuto", "Off")]:
+                    try: _set(self.cam_handle, feat, val)
+                    except Exception: pass
 
-            # 1) if you use continuous free-run, keep Trigger off
-            try:
-                _set(self.cam_handle, "TriggerSelector", "FrameStart")
-                _set(self.cam_handle, "TriggerMode", "Off")
-            except Exception:
-                pass
+                # 1) if you use continuous free-run, keep Trigger off
+                try:
+                    _set(self.cam_handle, "TriggerSelector", "FrameStart")
+                    _set(self.cam_handle, "TriggerMode", "Off")
+                except Exception:
+                    pass
 
-            # 2) Pixel format before timing stuff
-            try:
-                self.cam_handle.set_pixel_format(PixelFormat.Mono8)
-            except Exception:
-                pass
+                # 2) Pixel format before timing stuff
+                try:
+                    self.cam_handle.set_pixel_format(PixelFormat.Mono8)
+                except Exception:
+                    pass
+
+            # 2b) Sensor roi / binning / decimation (acquisition is stopped here)
+            if first or any(k in changed for k in FORMAT_PARAMS):
+                self._apply_format_params()
 
             # 3) Set ExposureTime (Vimba X uses microseconds)
-            try:
-                self.cam_handle.ExposureTime.set(float(p["exposure"]))
-            except Exception:
-                # fallback to legacy name if your model still uses it
-                try: self.cam_handle.ExposureTimeAbs.set(float(p["exposure"]))
-                except Exception: pass
+            if "exposure" in changed:
+                try:
+                    self.cam_handle.ExposureTime.set(float(p["exposure"]))
+                except Exception:
+                    # fallback to legacy name if your model still uses it
+                    try: self.cam_handle.ExposureTimeAbs.set(float(p["exposure"]))
+                    except Exception: pass
 
             # 4) Enable and set AcquisitionFrameRate (new names in Vimba X)
-            try:
-                self.cam_handle.AcquisitionFrameRateEnable.set(True)
-                fr_feat = self.cam_handle.AcquisitionFrameRate
-
-                # clamp to camera range & increment
-                lo, hi = fr_feat.get_range()
-                inc = fr_feat.get_increment()
-                target = float(p["frame_rate"])
-                target = min(max(target, lo), hi)
-                if inc and inc > 0:
-                    target = lo + round((target - lo) / inc) * inc
-                fr_feat.set(target)
-            except Exception:
-                # legacy fallback
+            if "frame_rate" in changed:
                 try:
-                    _set(self.cam_handle, "AcquisitionFrameRateAbs", float(p["frame_rate"]))
+                    self.cam_handle.AcquisitionFrameRateEnable.set(True)
+                    fr_feat = self.cam_handle.AcquisitionFrameRate
+
+                    # clamp to camera range & increment
+                    lo, hi = fr_feat.get_range()
+                    inc = fr_feat.get_increment()
+                    target = float(p["frame_rate"])
+                    target = min(max(target, lo), hi)
+                    if inc and inc > 0:
+                        target = lo + round((target - lo) / inc) * inc
+                    fr_feat.set(target)
                 except Exception:
-                    pass
+                    # legacy fallback
+                    try:
+                        _set(self.cam_handle, "AcquisitionFrameRateAbs", float(p["frame_rate"]))
+                    except Exception:
+                        pass
 
             # 5) (Optional) bandwidth cap if you ever drop frames on GigE/USB
             # try:
@@ -237,26 +296,70 @@ class AVTCam(GenericCam):
             #     pass
 
             # 6) Gain last
-            try:
-                self.cam_handle.Gain.set(p["gain"])
-            except Exception:
-                pass
+            # GainAuto stays Off (set on open), gain_auto is not applied
+            if "gain" in changed:
+                try:
+                    self.cam_handle.Gain.set(p["gain"])
+                except Exception:
+                    pass
 
             # Debug: read back what the camera accepted
-            try:
-                req = float(p["frame_rate"])
-                got = self.cam_handle.AcquisitionFrameRate.get()
-                display(f"Requested FPS={req:.2f}, camera accepted ≈{got:.2f} fps")
-            except Exception:
-                pass
+            if "frame_rate" in changed:
+                try:
+                    req = float(p["frame_rate"])
+                    got = self.cam_handle.AcquisitionFrameRate.get()
+                    display(f"Requested FPS={req:.2f}, camera accepted ≈{got:.2f} fps")
+                except Exception:
+                    pass
 
         except VmbFeatureError as err:
             display(f"Error applying parameters: {err}", level="warning")
+        self._mark_params_applied()
 
         if resume_recording:
             self._record()
 
+    def _apply_format_params(self):
+        if not any(k in self.params for k in FORMAT_PARAMS):
+            self._read_format()
+            return
+        fmt = get_format_params(self.params)
+        if fmt == self._format_applied:
+            return
+        sensor_w, sensor_h = self._sensor_size()
+        for name, val in sfnc_format_features(self.params, sensor_w or 1 << 16, sensor_h or 1 << 16):
+            try:
+                feat = getattr(self.cam_handle, name)
+            except AttributeError:
+                if val != 1 and name.startswith(("Binning", "Decimation")):
+                    display(f"AVT cam has no {name}, ignored.", level="warning")
+                continue
+            try:
+                lo, hi = feat.get_range()
+                feat.set(clamp_to_range(int(val), lo, hi, feat.get_increment()))
+            except Exception as e:
+                display(f"AVT: could not set {name} to {val}: {e}", level="warning")
+        self._format_applied = fmt
+        self._read_format()
+
+    def _sensor_size(self):
+        for w_name, h_name in (("SensorWidth", "SensorHeight"), ("WidthMax", "HeightMax")):
+            try:
+                return (int(getattr(self.cam_handle, w_name).get()),
+                        int(getattr(self.cam_handle, h_name).get()))
+            except Exception:
+                continue
+        return None, None
 
+    def _read_format(self):
+        try:
+            self.format["width"] = int(self.cam_handle.Width.get())
+            self.format["height"] = int(self.cam_handle.Height.get())
+        except Exception:
+            pass
+        sensor_w, sensor_h = self._sensor_size()
+        if sensor_w is not None:
+            self.format["max_width"], self.format["max_height"] = sensor_w, sensor_h
 
     # ------------------------------------------------------------------
     # acquisition
@@ -1,14 +1,58 @@
 import time
 import ctypes
+import copy
 
 import numpy as np
 from neucams.utils import display
 
+# params that change the frame size, drivers apply them with acquisition stopped
+FORMAT_PARAMS = ('roi', 'binning', 'decimation')
+
+
+def get_format_params(params):
+    """Returns (roi, binning, decimation) from params.
+    roi is [x, y, width, height] in unbinned sensor pixels or None for the full
+    sensor; width/height None extend the roi to the sensor edge."""
+    roi = params.get('roi', None)
+    if roi is not None:
+        x, y, w, h = (list(roi) + [None] * 4)[:4]
+        roi = [int(x or 0), int(y or 0),
+               None if w is None else int(w), None if h is None else int(h)]
+    return roi, int(params.get('binning', 1)), int(params.get('decimation', 1))
+
+
+def sfnc_format_features(params, sensor_width, sensor_height):
+    """Feature writes, in order, for the format params on GenICam SFNC cameras
+    (GenICam nodes, vmbpy features). Offsets and sizes are in binned pixels there."""
+    roi, binning, decimation = get_format_params(params)
+    x, y, w, h = roi if roi is not None else [0, 0, None, None]
+    w = sensor_width - x if w is None else w
+    h = sensor_height - y if h is None else h
+    scale = binning * decimation
+    return [('BinningHorizontal', binning), ('BinningVertical', binning),
+            ('DecimationHorizontal', decimation), ('DecimationVertical', decimation),
+            ('OffsetX', 0), ('OffsetY', 0),
+            ('Width', w // scale), ('Height', h // scale),
+            ('OffsetX', x // scale), ('OffsetY', y // scale)]
+
+
+def clamp_to_range(val, lo, hi, inc=None):
+    """Clamps val to [lo, hi] and rounds it down to lo + k * inc"""
+    val = min(max(val, lo), hi)
+    if inc:
+        val = lo + ((val - lo) // inc) * inc
+    return val
+
 
 class GenericCam:
     """Abstract class for interfacing with the cameras
     Has last frame on multiprocessing array
     """
+    # hardware drivers: probing opens the device, the handler keeps the format on disk
+    cache_format = False
+    # params the driver writes while streaming, changing any other one restarts the stream
+    live_params = ()
+
     def __init__(self, name = '', cam_id = None, params = None, format = None):
         
         self.name = name
@@ -21,7 +65,21 @@ class GenericCam:
         self.is_recording = False
         
         self.exposed_params = []
+        self._applied_params = {}
     
+    def set_roi(self, x=0, y=0, width=None, height=None):
+        """Sensor region of interest in unbinned pixels, applied by apply_params()"""
+        self.set_param('roi', [x, y, width, height])
+
+    def reset_roi(self):
+        self.set_param('roi', None)
+
+    def set_binning(self, binning):
+        self.set_param('binning', int(binning))
+
+    def set_decimation(self, decimation):
+        self.set_param('decimation', int(decimation))
+
     def _init_format(self):
         frame, _ = self.image()
         if frame is not None:
@@ -30,8 +88,25 @@ class GenericCam:
             self.format['n_chan'] = frame.shape[2] if frame.ndim == 3 else 1
             display(f"{self.name} - size: {self.format['height']} x {self.format['width']}")
     
+    def probe_format(self):
+        """Frame format (dtype, height, width, n_chan, max_height, max_width) for the
+        handler framebuffer. The default opens the camera, drivers override it to read
+        the format without starting the acquisition."""
+        with self:
+            return dict(self.format)
+
     def is_connected(self):
         pass
+
+    def is_triggered(self):
+        """True when frames wait for external (or software) triggers, a pause in the
+        stream is then not a fault. Drivers that can ask the device; this reads the
+        params ('triggered' or a TriggerMode other than Off)."""
+        params = {k.lower(): v for k, v in self.params.items()}
+        if params.get('triggered', False):
+            return True
+        mode = params.get('triggermode', None)
+        return mode is not None and str(mode).lower() not in ('off', '0', 'false', 'none')
         
     def __enter__(self):
         return self
@@ -46,6 +121,22 @@ class GenericCam:
     def apply_params(self):
         pass
     
+    def _params_changed(self):
+        """Params changed since the last _mark_params_applied(), all of them after
+        _forget_applied_params() (camera just opened)"""
+        return {k: v for k, v in self.params.items()
+                if k not in self._applied_params or self._applied_params[k] != v}
+
+    def _mark_params_applied(self, keys=None):
+        for k in (self.params if keys is None else keys):
+            self._applied_params[k] = copy.deepcopy(self.params[k])
+
+    def _forget_applied_params(self):
+        self._applied_params = {}
+
+    def _needs_restart(self, changed):
+        return self.is_recording and not set(changed) <= set(self.live_params)
+
     def set_param(self, param, val):
         # print(f"Set param {param} : {val}", flush=True)
         self.params[param] = val
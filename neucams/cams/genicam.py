@@ -5,9 +5,12 @@ import os, sys, time, glob
 from pathlib import Path
 import numpy as np
 from harvesters.core import Harvester
+from genicam.genapi import EAccessMode, EInterfaceType
 
-from .generic_cam import GenericCam
+from .generic_cam import (GenericCam, FORMAT_PARAMS, get_format_params,
+                          sfnc_format_features, clamp_to_range)
 from neucams.utils import display
+from . import registry
 
 # ----------------------------------------------------------------------
 # Globals
@@ -117,6 +120,16 @@ def get_loaded_cti_path() -> str | None:
 
 # ----------------------------------------------------------------------
 # Convenience
+def GenI_list_devices(refresh: bool = False) -> list:
+    """Devices known to the harvester (see registry), refresh rescans the GenTL producers."""
+    h = get_harvester()
+    if refresh:
+        h.update()
+    return [registry.DeviceInfo('genicam', getattr(dev, 'serial_number', None),
+                                getattr(dev, 'serial_number', None), i, getattr(dev, 'model', None))
+            for i, dev in enumerate(h.device_info_list)]
+
+
 def GenI_get_cam_ids(harvester: Harvester | None = None):
     h = harvester or get_harvester()
     infos = h.device_info_list
@@ -126,8 +139,145 @@ def GenI_get_cam_ids(harvester: Harvester | None = None):
 
 # ----------------------------------------------------------------------
 # Camera wrapper
+# ----------------------------------------------------------------------
+# Cached node accessors
+_FEATURE_NAMES = (
+    'EventNotification', 'PixelFormat', 'AcquisitionFrameRate', 'Gain', 'GainAuto',
+    'ExposureTime', 'ExposureMode',
+    'TriggerSelector', 'TriggerMode', 'TriggerSource', 'TriggerActivation',
+    'lineDetectionLevel', 'lineDebouncingPeriod',
+    'BinningHorizontal', 'BinningVertical', 'DecimationHorizontal', 'DecimationVertical',
+    'OffsetX', 'OffsetY', 'Width', 'Height',
+    'SensorWidth', 'SensorHeight', 'WidthMax', 'HeightMax',
+)
+_NUMERIC = (EInterfaceType.intfIInteger, EInterfaceType.intfIFloat)
+# ranges that follow other features (offsets the size, size the binning, frame rate
+# the exposure and back): read again from the device right before each write
+_DEPENDENT_RANGES = ('OffsetX', 'OffsetY', 'Width', 'Height', 'AcquisitionFrameRate', 'ExposureTime')
+
+
+class _Feature:
+    """Node handle resolved once, with its interface, access mode and range"""
+    __slots__ = ('name', 'node', 'kind', 'writable', 'readable', 'min', 'max', 'inc', 'symbolics')
+
+    def __init__(self, name, node):
+        self.name = name
+        self.node = node
+        self.kind = node.node.principal_interface_type
+        self.refresh()
+
+    def refresh(self):
+        """Access mode and range can depend on other features (binning, frame rate...)"""
+        mode = self.node.node.get_access_mode()
+        self.writable = mode in (EAccessMode.RW, EAccessMode.WO)
+        self.readable = mode in (EAccessMode.RW, EAccessMode.RO)
+        self.min = self.max = self.inc = None
+        self.symbolics = None
+        if not self.readable:
+            return
+        if self.kind in _NUMERIC:
+            self.min, self.max = self.node.min, self.node.max
+            try:
+                self.inc = self.node.inc if self.kind == EInterfaceType.intfIInteger or self.node.has_inc() else None
+            except Exception:
+                self.inc = None
+        elif self.kind == EInterfaceType.intfIEnumeration:
+            self.symbolics = tuple(self.node.symbolics)
+
+    def coerce(self, val):
+        """Value clamped / checked locally, raises ValueError if it can not be written"""
+        if self.kind == EInterfaceType.intfIInteger:
+            return int(clamp_to_range(int(val), self.min, self.max, self.inc))
+        if self.kind == EInterfaceType.intfIFloat:
+            return float(clamp_to_range(float(val), self.min, self.max, self.inc))
+        if self.kind == EInterfaceType.intfIBoolean:
+            return bool(val)
+        if self.kind == EInterfaceType.intfIEnumeration and self.symbolics is not None:
+            if str(val) not in self.symbolics:
+                raise ValueError(f"{val} not in {self.symbolics}")
+            return str(val)
+        return val
+
+
+class FeatureTable:
+    """Node map lookups are slow in GenApi, nodes are resolved once when the camera
+    is opened and writes go through the cached handles."""
+    def __init__(self, node_map, names=_FEATURE_NAMES):
+        self.node_map = node_map
+        self.features = {}
+        self._all_names = None
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        if name in self.features:
+            return self.features[name]
+        try:
+            node = getattr(self.node_map, name)
+            feature = _Feature(name, node)
+        except Exception:
+            feature = None  # not implemented on this camera
+        self.features[name] = feature
+        return feature
+
+    def __contains__(self, name):
+        return self.features.get(name) is not None
+
+    def get(self, name, default=None):
+        feature = self.features.get(name)
+        if feature is None or not feature.readable:
+            return default
+        try:
+            return feature.node.value
+        except Exception:
+            return default
+
+    def set(self, name, val, warn=True):
+        """Writes val (clamped to the cached range, read again first for _DEPENDENT_RANGES);
+        on failure the access mode and range are read again from the device and the
+        write is retried once. Returns the written value, None if it was not written."""
+        feature = self.features.get(name) if name in self.features else self.add(name)
+        if feature is None:
+            return None
+        if name in _DEPENDENT_RANGES:
+            try:
+                feature.refresh()
+            except Exception:
+                pass  # cached range, the retry below refreshes again
+        for attempt in range(2):
+            try:
+                if not feature.writable:
+                    raise ValueError('not writable')
+                val_out = feature.coerce(val)
+                feature.node.value = val_out
+                return val_out
+            except Exception as e:
+                if attempt == 0:
+                    try:
+                        feature.refresh()
+                        continue
+                    except Exception:
+                        pass
+                if warn:
+                    display(f"GenICam: could not set {name} to {val}: {e}", level='warning')
+                return None
+
+    def names(self):
+        """All the features of the node map (walked once)"""
+        if self._all_names is None:
+            self._all_names = [n for n in dir(self.node_map) if not n.startswith('_')]
+        return self._all_names
+
+
+# params that (re)configure the trigger
+_TRIGGER_PARAMS = ('triggered', 'TriggerSelector', 'TriggerMode', 'TriggerSource',
+                   'TriggerActivation', 'lineDetectionLevel', 'lineDebouncingPeriod')
+
+
 class GenICam(GenericCam):
     timeout_ms = 2000  # now clearly milliseconds
+    cache_format = True
+    live_params = ('exposure', 'gain', 'gain_auto')
 
     def __init__(self, cam_id=None, params=None, format=None):
         self.h = get_harvester()
@@ -147,13 +297,22 @@ class GenICam(GenericCam):
         }
         self.exposed_params = [
             'frame_rate', 'gain', 'exposure', 'gain_auto',
-            'triggered', 'acquisition_mode', 'n_frames'
+            'triggered', 'acquisition_mode', 'n_frames',
+            'roi', 'binning', 'decimation'
         ]
         self.params = {**default_params, **self.params}
         default_format = {'dtype': np.uint8}
         self.format = {**default_format, **self.format}
+        self._format_applied = None
 
     # ------------------------------------------------------------------
+    def is_triggered(self):
+        features = getattr(self, 'features', None)
+        mode = features.get('TriggerMode') if features is not None else None
+        if mode is None:
+            return super().is_triggered()  # not opened yet
+        return str(mode) != 'Off'
+
     def is_connected(self):
         if self.h is None:
             display("Harvester library not available.", level='error')
@@ -168,6 +327,26 @@ class GenICam(GenericCam):
         display(f"Requested GenICam cam NOT detected {self.cam_id}.", level='error')
         return False
 
+    def probe_format(self):
+        """Applies the params and reads the format from the node map, no streaming."""
+        dev = registry.find_device('genicam', self.cam_id)
+        if self.h is None or dev is None:
+            return dict(self.format)
+        ia = self.h.create(dev.index)
+        try:
+            self.cam_handle = ia
+            self.features = FeatureTable(ia.remote_device.node_map)
+            self._forget_applied_params()
+            self.apply_params()
+            self._read_format()
+        finally:
+            self.cam_handle = None
+            self._format_applied = None
+            self._forget_applied_params()
+            ia.destroy()
+        self.format.setdefault('n_chan', 1)  # Mono8, see apply_params
+        return dict(self.format)
+
     # ------------------------------------------------------------------
     def __enter__(self):
         if self.h is None:
@@ -175,12 +354,8 @@ class GenICam(GenericCam):
             self.cam_handle = None
             return self
 
-        ids, devices = GenI_get_cam_ids(self.h)
-        cam_index = None
-        for idx, dev in enumerate(devices):
-            if getattr(dev, 'serial_number', None) == self.cam_id:
-                cam_index = idx
-                break
+        dev = registry.find_device('genicam', self.cam_id)
+        cam_index = dev.index if dev is not None else None
         if cam_index is None:
             display(f"Could not find camera with serial_number {self.cam_id}", level='error')
             self.cam_handle = None
@@ -188,8 +363,9 @@ class GenICam(GenericCam):
 
         self.cam_handle = self.h.create(cam_index)
         self.cam_handle.__enter__()
+        self._forget_applied_params()
         self.cam_handle.num_buffers = 2
-        self.features = self.cam_handle.remote_device.node_map
+        self.features = FeatureTable(self.cam_handle.remote_device.node_map)
         self.apply_params()
         self._record()
         self._init_format()
@@ -214,61 +390,114 @@ class GenICam(GenericCam):
 
     # ------------------------------------------------------------------
     def apply_params(self):
+        """Writes the params changed since the last call. exposure / gain are written
+        while streaming, anything else stops the stream meanwhile."""
         if not getattr(self, 'cam_handle', None):
             display('apply_params() called, but camera was never opened.', level='warning')
             return
-        params = {
-            'EventNotification': 'On',
-            'PixelFormat': 'Mono8',
-            'AcquisitionFrameRate': self.params['frame_rate'],
-            'Gain': self.params['gain'],
-            'GainAuto': 'Once' if self.params['gain_auto'] else 'Off',
-            'ExposureTime': self.params['exposure'],
-            'ExposureMode': 'Timed'
-        }
-        for key, val in params.items():
+        changed = self._params_changed()
+        if not changed:
+            return
+        first = not self._applied_params
+        restart = self._needs_restart(changed)
+        if restart:
+            self.cam_handle.stop()
+
+        p = self.params
+        writes = []
+        if first:
+            writes += [('EventNotification', 'On'), ('PixelFormat', 'Mono8')]
+        if 'frame_rate' in changed:
+            writes.append(('AcquisitionFrameRate', p['frame_rate']))
+        if 'gain' in changed:
+            writes.append(('Gain', p['gain']))
+        if 'gain_auto' in changed:
+            writes.append(('GainAuto', 'Once' if p['gain_auto'] else 'Off'))
+        if 'exposure' in changed:
+            writes.append(('ExposureTime', p['exposure']))
+        # ExposureMode can be overridden from the JSON
+        if first or 'ExposureMode' in changed:
+            writes.append(('ExposureMode', p.get('ExposureMode', 'Timed')))
+
+        # ----- trigger-related keys from JSON -----
+        if first or any(k in changed for k in _TRIGGER_PARAMS):
+            use_trigger = p.get('triggered', False) or (p.get('TriggerMode', 'Off') != 'Off')
+            if use_trigger:
+                # Some GenICam stacks require TriggerSelector first
+                writes += [
+                    ('TriggerSelector',      p.get('TriggerSelector', 'FrameStart')),
+                    ('TriggerMode',          p.get('TriggerMode', 'On')),
+                    ('TriggerSource',        p.get('TriggerSource', 'Line1')),
+                    ('TriggerActivation',    p.get('TriggerActivation', 'RisingEdge')),
+                    ('lineDetectionLevel',   p.get('lineDetectionLevel', 'TTL')),
+                    ('lineDebouncingPeriod', p.get('lineDebouncingPeriod', 0)),
+                ]
+            elif not first:
+                writes.append(('TriggerMode', 'Off'))
+
+        for key, val in writes:
+            # optional nodes are skipped quietly, user params are reported
+            self.features.set(key, val, warn=key not in ('EventNotification', 'ExposureMode'))
+
+        if first or any(k in changed for k in FORMAT_PARAMS):
+            self._apply_format_params()
+        self._mark_params_applied()
+
+        if restart:
+            if 'acquisition_mode' in changed or 'n_frames' in changed:
+                self._record()  # new frame generator for the frame limit
+            else:
+                self.cam_handle.start()
+
+    # ------------------------------------------------------------------
+    def _apply_format_params(self):
+        """roi / binning / decimation through the SFNC nodes (stream stopped by apply_params)"""
+        if not any(k in self.params for k in FORMAT_PARAMS):
+            self._read_format()
+            return
+        fmt = get_format_params(self.params)
+        if fmt == self._format_applied:
+            return
+        sensor_w, sensor_h = self._sensor_size()
+        for name, val in sfnc_format_features(self.params, sensor_w or 1 << 16, sensor_h or 1 << 16):
+            if name not in self.features:
+                if val != 1 and name.startswith(('Binning', 'Decimation')):
+                    display(f"GenICam cam has no {name}, ignored.", level='warning')
+                continue
+            self.features.set(name, val)  # size / offset ranges are refreshed by set()
+        self._format_applied = fmt
+        self._read_format()
+
+    def _sensor_size(self):
+        for w_name, h_name in (('SensorWidth', 'SensorHeight'), ('WidthMax', 'HeightMax')):
             try:
-                if hasattr(self.features, key):
-                    getattr(self.features, key).value = val
+                return (int(self.features.get(w_name)),
+                        int(self.features.get(h_name)))
             except Exception:
-                pass
+                continue
+        return None, None
 
-        # ----- extra: allow ExposureMode override from JSON -----
+    def _read_format(self):
         try:
-            if hasattr(self.features, 'ExposureMode'):
-                self.features.ExposureMode.value = self.params.get('ExposureMode', 'Timed')
+            self.format['width'] = int(self.features.get('Width'))
+            self.format['height'] = int(self.features.get('Height'))
         except Exception:
             pass
-
-        # ----- extra: map trigger-related keys from JSON -----
-        use_trigger = self.params.get('triggered', False) or \
-                      (self.params.get('TriggerMode', 'Off') != 'Off')
-        if use_trigger:
-            # Some GenICam stacks require TriggerSelector first
-            for k, v in {
-                'TriggerSelector':       self.params.get('TriggerSelector', 'FrameStart'),
-                'TriggerMode':           self.params.get('TriggerMode', 'On'),
-                'TriggerSource':         self.params.get('TriggerSource', 'Line1'),
-                'TriggerActivation':     self.params.get('TriggerActivation', 'RisingEdge'),
-                'lineDetectionLevel':    self.params.get('lineDetectionLevel', 'TTL'),
-                'lineDebouncingPeriod':  self.params.get('lineDebouncingPeriod', 0)
-            }.items():
-                try:
-                    if hasattr(self.features, k):
-                        getattr(self.features, k).value = v
-                except Exception:
-                    pass
-
+        sensor_w, sensor_h = self._sensor_size()
+        if sensor_w is not None:
+            self.format['max_width'], self.format['max_height'] = sensor_w, sensor_h
     # ------------------------------------------------------------------
     def get_features(self):
         if not getattr(self, 'cam_handle', None):
             display('get_features() called, but camera was never opened.', level='warning')
             return ''
         out = []
-        nm = self.cam_handle.remote_device.node_map
-        for feature_name in dir(nm):
+        for feature_name in self.features.names():
+            feature = self.features.add(feature_name)  # resolved once, cached afterwards
+            if feature is None or not feature.readable:
+                continue
             try:
-                out.append(f"{feature_name}: {getattr(nm, feature_name).to_string()}")
+                out.append(f"{feature_name}: {feature.node.to_string()}")
             except Exception:
                 pass
         return "\n".join(out)
@@ -1,15 +1,20 @@
 # neucams/cams/hamamatsu_cam.py
 from __future__ import annotations
-import logging, time
+import ctypes, logging, time
+from collections import deque
 from typing import List, Optional, Tuple
 import numpy as np
 
 # pyDCAM
 from pyDCAM import dcamapi_init, dcamapi_uninit, HDCAM
+from pyDCAM.dcamapi import dcamapi as _dcamdll, check_status
+from pyDCAM.dcamapi_struct import DCAMBUF_ATTACH
 from pyDCAM.dcamprop import DCAMIDPROP
-from pyDCAM.dcamapi_enum import DCAM_IDSTR
+from pyDCAM.dcamapi_enum import DCAM_IDSTR, DCAMBUF_ATTACHKIND
 
-from .generic_cam import GenericCam
+from .generic_cam import GenericCam, FORMAT_PARAMS, get_format_params, clamp_to_range
+from neucams.frame_ring import FrameRing
+from . import registry
 
 LOG = logging.getLogger(__name__)
 
@@ -18,38 +23,49 @@ class _DCAMRuntime:
     _booted = False
     _ref = 0
 
+    # class attributes: the DCAM runtime is shared by every instance in the process
     def __enter__(self):
-        if not self._booted:
+        cls = type(self)
+        if not cls._booted:
             dcamapi_init()
-            self._booted = True
-        self._ref += 1
+            cls._booted = True
+        cls._ref += 1
         return self
 
     def __exit__(self, exc_type, exc, tb):
-        self._ref -= 1
-        if self._booted and self._ref <= 0:
+        cls = type(self)
+        cls._ref -= 1
+        if cls._booted and cls._ref <= 0:
             try:
                 dcamapi_uninit()
             finally:
-                self._booted = False
-                self._ref = 0
+                cls._booted = False
+                cls._ref = 0
 
     @staticmethod
-    def list_camera_ids() -> List[str]:
-        ids: List[str] = []
+    def list_devices() -> List[registry.DeviceInfo]:
+        """Opens every HDCAM once to read its id and model (see registry)."""
+        devices = []
         cold = not _DCAMRuntime._booted
-        if cold:
-            count = dcamapi_init()
-        else:
-            count = dcamapi_init()
+        count = dcamapi_init()
         try:
             for i in range(count):
                 with HDCAM(i) as cam:
-                    ids.append(cam.dcamdev_getstring(DCAM_IDSTR.DCAM_IDSTR_CAMERAID))
+                    camid = cam.dcamdev_getstring(DCAM_IDSTR.DCAM_IDSTR_CAMERAID)
+                    model = cam.dcamdev_getstring(DCAM_IDSTR.DCAM_IDSTR_MODEL)
+                devices.append(registry.DeviceInfo('hamamatsu', camid, i, i, model))
         finally:
             if cold:
                 dcamapi_uninit()
-        return ids
+        return devices
+
+    @staticmethod
+    def list_camera_ids() -> List[str]:
+        return [d.serial for d in registry.list_devices('hamamatsu')]
+
+
+def DCAM_list_devices(refresh: bool = False) -> List[registry.DeviceInfo]:
+    return _DCAMRuntime.list_devices()
 
 
 class HamamatsuCam(GenericCam):
@@ -57,7 +73,16 @@ class HamamatsuCam(GenericCam):
     DCAM-API backend via pyDCAM.
     - Selects device by serial_number (preferred) or falls back to first.
     - Starts acquisition in __enter__ (to match your other drivers).
+    - Captures straight into a shared-memory FrameRing attached with
+      dcambuf_attach (param "attach_buffers", default True); frames are
+      returned as views into the ring and handed to the writer by reference.
+    - Every wait drains all frames transferred since the previous one; frames
+      lost because the ring wrapped are counted in `overruns`.
+    - roi / binning are applied through the DCAM subarray and binning props;
+      capture is restarted when they change (no decimation on DCAM).
     """
+    cache_format = True
+    live_params = ("exposure", "exposure_time")
 
     def __init__(
         self,
@@ -73,8 +98,13 @@ class HamamatsuCam(GenericCam):
         self._rt = _DCAMRuntime()
         self._cam: Optional[HDCAM] = None
         self._wait = None
-        self._bufs = max(3, frame_count or 10)
-        self._frame_idx = 0
+        self._bufs = max(3, int(self.params.get("n_buffers", frame_count or 10)))
+        self._last_count = 0       # DCAM transfer count already queued
+        self._pending = deque()    # drained frames not yet returned by image()
+        self.overruns = 0          # frames overwritten before we could read them
+        self._ring: Optional[FrameRing] = None
+        self._ring_ptrs = None
+        self._format_applied = None
 
         self.serial_number = serial_number
         self.exposure_time = exposure_time
@@ -83,13 +113,14 @@ class HamamatsuCam(GenericCam):
 
         # for handler framebuffer init
         self.format.setdefault("dtype", np.uint16)
-        self.exposed_params = ["exposure", "binning"]
+        self.exposed_params = ["exposure", "binning", "roi"]
 
     # ------------ lifecycle ------------
     def __enter__(self):
         self._rt.__enter__()
         idx = self._resolve_camera_index()
         self._cam = HDCAM(idx).__enter__()
+        self._forget_applied_params()
         LOG.info("Hamamatsu camera opened: %s",
                  self._cam.dcamdev_getstring(DCAM_IDSTR.DCAM_IDSTR_MODEL))
 
@@ -101,13 +132,16 @@ class HamamatsuCam(GenericCam):
         # format before starting
         self._query_format()
 
-        # allocate & start
-        self._cam.dcambuf_alloc(self._bufs)
+        self._start_capture()
+        return self
+
+    def _start_capture(self):
+        self._alloc_buffers()
         self._wait = self._cam.dcamwait_open()
         self._cam.dcamcap_start()
         self.is_recording = True
-        self._frame_idx = 0
-        return self
+        self._last_count = 0
+        self._pending.clear()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         try:
@@ -129,37 +163,132 @@ class HamamatsuCam(GenericCam):
             pass
         finally:
             self.is_recording = False
+        self._pending.clear()
         try:
             self._cam.dcambuf_release()
         except Exception:
             pass
+        self._release_ring()
+        try:
+            if self._wait is not None:
+                self._wait.dcamwait_close()
+        except Exception:
+            pass
         self._wait = None
 
+    # ------------ capture buffers ------------
+    def _alloc_buffers(self):
+        if self.params.get("attach_buffers", True):
+            try:
+                self._attach_ring()
+                return
+            except Exception as e:
+                LOG.warning("DCAM buffer attach failed (%r), using internal buffers", e)
+                self._release_ring()
+        self._cam.dcambuf_alloc(self._bufs)
+
+    def _attach_ring(self):
+        dtype = np.dtype(self.format["dtype"])
+        h, w = self.format["height"], self.format["width"]
+        rowbytes = int(self._cam.dcamprop_getvalue(DCAMIDPROP.DCAM_IDPROP_BUFFER_ROWBYTES))
+        if rowbytes != w * dtype.itemsize:
+            raise RuntimeError(f"padded rows ({rowbytes} bytes) cannot be attached")
+        self._ring = FrameRing(self._bufs, (h, w), dtype)
+        self._ring_ptrs = self._ring.slot_pointers()
+        param = DCAMBUF_ATTACH()
+        param.size = ctypes.sizeof(param)
+        param.iKind = DCAMBUF_ATTACHKIND.DCAMBUF_ATTACHKIND_FRAME
+        param.buffer = ctypes.cast(self._ring_ptrs, ctypes.POINTER(ctypes.c_void_p))
+        param.buffercount = self._bufs
+        check_status(_dcamdll.dcambuf_attach(self._cam.hdcam, ctypes.byref(param)))
+        LOG.info("Hamamatsu capturing into shared ring %s (%d frames)", self._ring.name, self._bufs)
+
+    def _release_ring(self):
+        if self._ring is not None:
+            self._ring.close()
+        self._ring = None
+        self._ring_ptrs = None
+
     # ------------ acquisition ------------
     def image(self) -> Tuple[Optional[np.ndarray], str | Tuple[int, float]]:
         if not self.is_recording or self._cam is None or self._wait is None:
             return None, "not recording"
         try:
-            self._wait.dcamwait_start(timeout=1000)  # ms
-            frame = self._cam.dcambuf_copyframe()
-            if frame is None or frame.size == 0:
+            if not self._pending:
+                self._wait.dcamwait_start(timeout=1000)  # ms
+                self._drain()
+            if not self._pending:
                 return None, "timeout"
-            if "height" not in self.format:
-                self._set_format_from_frame(frame)
-            meta = (self._frame_idx, time.time())
-            self._frame_idx += 1
-            return frame, meta
+            self._drop_stale()
+            if not self._pending:
+                return None, "overrun"
+            return self._pending.popleft()
         except Exception as e:
             LOG.error("Hamamatsu acquisition error: %r", e)
             return None, f"acquisition error: {e}"
 
+    def _drain(self):
+        """Queue every frame transferred since the last call.
+        Frame ids are DCAM transfer counts (0 based), so gaps show up in the metadata."""
+        newest, count = self._cam.dcamcap_transferinfo()
+        n_new = count - self._last_count
+        if newest < 0 or n_new <= 0:
+            return
+        # one slot may already be refilled by the frame in flight
+        readable = self._bufs - 1
+        if n_new > readable:
+            lost = n_new - readable
+            self.overruns += lost
+            LOG.warning("Hamamatsu ring overrun: lost %d frames (%d total)", lost, self.overruns)
+            n_new = readable
+        if self._ring is not None:
+            self._ring.set_count(count)
+        timestamp = time.time()
+        for c in range(count - n_new + 1, count + 1):
+            slot = (newest - (count - c)) % self._bufs
+            if self._ring is not None:
+                # DCAM wrote the frame into our ring: queue a view on the slot
+                frame = self._ring.frames[slot]
+                meta = (c - 1, timestamp, self._ring.ref(slot, c))
+            else:
+                frame = self._cam.dcambuf_copyframe(slot)
+                if frame is None or frame.size == 0:
+                    continue
+                if "height" not in self.format:
+                    self._set_format_from_frame(frame)
+                meta = (c - 1, timestamp)
+            self._pending.append((frame, meta))
+        self._last_count = count
+
+    def _drop_stale(self):
+        """DCAM keeps writing the ring while the handler works: refresh the ring
+        count and drop the queued views whose slot was reused since the drain."""
+        if self._ring is None:
+            return  # copied frames do not go stale
+        _, count = self._cam.dcamcap_transferinfo()
+        self._ring.set_count(count)
+        stale = 0
+        while self._pending and not self._ring.is_valid(self._pending[0][1][2]):
+            self._pending.popleft()
+            stale += 1
+        if stale:
+            self.overruns += stale
+            LOG.warning("Hamamatsu ring overrun: lost %d queued frames (%d total)", stale, self.overruns)
+
+    def get_health_status(self):
+        return {"frames": self._last_count, "overruns": self.overruns,
+                "pending": len(self._pending)}
+
     # ------------ params / format ------------
     def _query_format(self):
         w = int(self._cam.dcamprop_getvalue(DCAMIDPROP.DCAM_IDPROP_IMAGE_WIDTH))
         h = int(self._cam.dcamprop_getvalue(DCAMIDPROP.DCAM_IDPROP_IMAGE_HEIGHT))
+        sensor_w, sensor_h, _ = self._sensor_size()
         self.format.update({
             "width":  w,
             "height": h,
+            "max_width":  sensor_w,
+            "max_height": sensor_h,
             "n_chan": 1,
             "dtype":  np.uint16,  # numpy dtype object (camera gives 16-bit)
         })
@@ -173,10 +302,62 @@ class HamamatsuCam(GenericCam):
         self.format["dtype"]  = frame.dtype
 
     def apply_params(self):
+        """Writes the params changed since the last call; exposure is set during
+        capture, roi / binning restart it (see _apply_format_params)."""
         if self._cam is None or not self.params:
             return
-        for k, v in self.params.items():
-            self._try_set(k.lower(), v)
+        changed = self._params_changed()
+        for k, v in changed.items():
+            if k.lower() not in FORMAT_PARAMS:
+                self._try_set(k.lower(), v)
+        self._apply_format_params()
+        self._mark_params_applied()
+
+    def _apply_format_params(self):
+        if not any(k in self.params for k in FORMAT_PARAMS):
+            return  # keep whatever the camera is set to
+        fmt = get_format_params(self.params)
+        if fmt == self._format_applied:
+            return
+        roi, binning, decimation = fmt
+        if decimation != 1:
+            LOG.warning("Hamamatsu: decimation is not supported, ignored")
+        # subarray and binning can only change while capture is stopped
+        restart = self.is_recording
+        if restart:
+            self.stop()
+        try:
+            self._cam.dcamprop_setvalue(DCAMIDPROP.DCAM_IDPROP_BINNING, binning)
+            self._set_subarray(roi)
+        except Exception as e:
+            LOG.warning("Hamamatsu: could not apply roi %s / binning %s: %r", roi, binning, e)
+        self._format_applied = fmt
+        self._query_format()
+        if restart:
+            self._start_capture()
+
+    def _sensor_size(self):
+        """(width, height, step) of the subarray, in sensor pixels"""
+        hattr = self._cam.dcamprop_getattr(DCAMIDPROP.DCAM_IDPROP_SUBARRAYHSIZE)
+        vattr = self._cam.dcamprop_getattr(DCAMIDPROP.DCAM_IDPROP_SUBARRAYVSIZE)
+        step = max(1, int(hattr["valuestep"]), int(vattr["valuestep"]))
+        return int(hattr["valuemax"]), int(vattr["valuemax"]), step
+
+    def _set_subarray(self, roi):
+        self._cam.subarray_mode = False
+        if roi is None:
+            return
+        sensor_w, sensor_h, step = self._sensor_size()
+        x, y, w, h = roi
+        x = clamp_to_range(x, 0, sensor_w - step, step)
+        y = clamp_to_range(y, 0, sensor_h - step, step)
+        w = clamp_to_range(sensor_w - x if w is None else w, step, sensor_w - x, step)
+        h = clamp_to_range(sensor_h - y if h is None else h, step, sensor_h - y, step)
+        # position first to 0 so the new size always fits the sensor
+        self._cam.subarray_pos = (0, 0)
+        self._cam.subarray_size = (w, h)
+        self._cam.subarray_pos = (x, y)
+        self._cam.subarray_mode = True
 
     def _try_set(self, key: str, val) -> bool:
         try:
@@ -184,9 +365,6 @@ class HamamatsuCam(GenericCam):
                 secs = float(val) / 1e6 if isinstance(val, (int, np.integer)) else float(val)
                 self._cam.dcamprop_setvalue(DCAMIDPROP.DCAM_IDPROP_EXPOSURETIME, secs)
                 return True
-            if key == "binning":
-                self._cam.dcamprop_setvalue(DCAMIDPROP.DCAM_IDPROP_BINNING, int(val))
-                return True
             # add more DCAM props here as needed
             return False
         except Exception:
@@ -194,31 +372,42 @@ class HamamatsuCam(GenericCam):
 
     # ------------ discovery ------------
     def _resolve_camera_index(self) -> int:
-        count = dcamapi_init()
-        if count <= 0:
+        dev = registry.find_device("hamamatsu", self.serial_number)
+        if dev is None:
+            if self.serial_number:
+                raise RuntimeError(f"No Hamamatsu camera with serial '{self.serial_number}' found.")
             raise RuntimeError("No Hamamatsu cameras detected.")
-        if self.serial_number:
-            for i in range(count):
-                with HDCAM(i) as cam:
-                    camid = cam.dcamdev_getstring(DCAM_IDSTR.DCAM_IDSTR_CAMERAID)
-                    if str(self.serial_number) in str(camid):
-                        return i
-            raise RuntimeError(f"No Hamamatsu camera with serial '{self.serial_number}' found.")
-        return 0
+        return dev.index
 
     # ------------ misc ------------
+    def probe_format(self) -> dict:
+        """Opens the HDCAM and applies the params, without allocating buffers or capturing."""
+        with self._rt:
+            self._cam = HDCAM(self._resolve_camera_index()).__enter__()
+            self._forget_applied_params()
+            try:
+                if self.exposure_time is not None:
+                    self._try_set("exposure_time", self.exposure_time)
+                self.apply_params()
+                self._query_format()
+            finally:
+                self._cam.__exit__(None, None, None)
+                self._cam = None
+                self._format_applied = None
+                self._forget_applied_params()
+        return dict(self.format)
+
+    def is_triggered(self) -> bool:
+        if self._cam is not None:
+            try:
+                # 1 is DCAMPROP_TRIGGERSOURCE__INTERNAL (free running)
+                return int(self._cam.dcamprop_getvalue(DCAMIDPROP.DCAM_IDPROP_TRIGGERSOURCE)) != 1
+            except Exception:
+                pass
+        return super().is_triggered()
+
     def is_connected(self) -> bool:
-        try:
-            with self._rt:
-                if self.serial_number:
-                    try:
-                        self._resolve_camera_index()
-                        return True
-                    except Exception:
-                        return False
-                return dcamapi_init() > 0
-        except Exception:
-            return False
+        return registry.find_device("hamamatsu", self.serial_number) is not None
 
     @staticmethod
     def list_cameras() -> List[str]:
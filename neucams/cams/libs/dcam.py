@@ -39,19 +39,49 @@ def dcammisc_setupframe(hdcam, bufframe: DCAMBUF_FRAME):
     return err
 
 
+def dcammisc_frame_dtype(frame: DCAMBUF_FRAME):
+    """
+    NumPy dtype of the pixels described by DCAMBUF_FRAME, None if not supported.
+
+    """
+    if frame.type == DCAM_PIXELTYPE.MONO16:
+        return np.dtype('uint16')
+
+    if frame.type == DCAM_PIXELTYPE.MONO8:
+        return np.dtype('uint8')
+
+    return None
+
+
 def dcammisc_alloc_ndarray(frame: DCAMBUF_FRAME):
     """
     Allocate NumPy ndarray based on information of DCAMBUF_FRAME.
 
     """
+    dtype = dcammisc_frame_dtype(frame)
+    if dtype is None:
+        return False
 
-    if frame.type == DCAM_PIXELTYPE.MONO16:
-        return np.zeros((frame.height, frame.width), dtype='uint16')
+    return np.zeros((frame.height, frame.width), dtype=dtype)
 
-    if frame.type == DCAM_PIXELTYPE.MONO8:
-        return np.zeros((frame.height, frame.width), dtype='uint8')
 
-    return False
+def dcammisc_check_ndarray(frame: DCAMBUF_FRAME, npBuf):
+    """
+    Check that NumPy ndarray can receive the image described by DCAMBUF_FRAME.
+    Rows may be strided (e.g. a view into a larger array) but pixels must be contiguous.
+
+    """
+    dtype = dcammisc_frame_dtype(frame)
+    if dtype is None:
+        return False
+
+    if not isinstance(npBuf, np.ndarray) or npBuf.dtype != dtype or not npBuf.flags.writeable:
+        return False
+
+    if npBuf.shape != (frame.height, frame.width) or npBuf.strides[1] != dtype.itemsize:
+        return False
+
+    return True
 
 
 # ==== declare Dcamapi class ====
@@ -145,6 +175,8 @@ class Dcam:
         self.__hdcam = 0
         self.__hdcamwait = 0
         self.__bufframe = DCAMBUF_FRAME()
+        self.__copyframe = DCAMBUF_FRAME()  # reused by the *_into functions
+        self.__bufcount = 0
 
     def __repr__(self):
         return 'Dcam()'
@@ -451,6 +483,7 @@ class Dcam:
         if ret is False:
             return False
 
+        self.__bufcount = nFrame
         return self.__result(dcammisc_setupframe(self.__hdcam, self.__bufframe))
 
     def buf_release(self):
@@ -465,6 +498,7 @@ class Dcam:
             return self.__result(DCAMERR.INVALIDHANDLE)  # instance is not opened yet.
 
         cOption = c_int32(0)
+        self.__bufcount = 0
         return self.__result(dcambuf_release(self.__hdcam, cOption))
 
     def buf_getframe(self, iFrame):
@@ -527,6 +561,103 @@ class Dcam:
         """
         return self.buf_getframedata(-1)
 
+    def buf_getframe_into(self, iFrame, npBuf):
+        """
+        Copy image data specified by iFrame into a preallocated NumPy buffer.
+        Nothing is allocated, so npBuf can be reused or be a slot of a buffer pool.
+
+        Args:
+            arg1(int): Index of target frame
+            arg2(ndarray): (height, width) buffer with the camera pixel type
+
+        Returns:
+            DCAMBUF_FRAME: frame information (reused by the next *_into call)
+            False:  error happens.  lasterr() returns the DCAMERR value
+        """
+        if not self.is_opened():
+            return self.__result(DCAMERR.INVALIDHANDLE)  # instance is not opened yet.
+
+        if not dcammisc_check_ndarray(self.__bufframe, npBuf):
+            return self.__result(DCAMERR.INVALIDPARAM)
+
+        aFrame = self.__copyframe
+        aFrame.iFrame = iFrame
+        aFrame.buf = npBuf.ctypes.data_as(c_void_p)
+        aFrame.rowbytes = npBuf.strides[0]
+        aFrame.type = self.__bufframe.type
+        aFrame.width = self.__bufframe.width
+        aFrame.height = self.__bufframe.height
+
+        ret = self.__result(dcambuf_copyframe(self.__hdcam, byref(aFrame)))
+        if ret is False:
+            return False
+
+        return aFrame
+
+    def buf_getframedata_into(self, iFrame, npBuf):
+        """
+        Fill preallocated NumPy buffer with image data specified by iFrame.
+
+        Arg:
+            arg1(int): Index of target frame
+            arg2(ndarray): (height, width) buffer with the camera pixel type
+
+        Returns:
+            npBuf:  the NumPy buffer that was passed
+            False:  error happens.  lasterr() returns the DCAMERR value
+        """
+        ret = self.buf_getframe_into(iFrame, npBuf)
+        if ret is False:
+            return False
+
+        return npBuf
+
+    def buf_getlastframedata_into(self, npBuf):
+        """
+        Fill preallocated NumPy buffer with image data of last updated frame
+
+        Returns:
+            npBuf:  the NumPy buffer that was passed
+            False:  error happens.  lasterr() returns the DCAMERR value
+        """
+        return self.buf_getframedata_into(-1, npBuf)
+
+    def buf_getframes(self, iFirst, iLast, npBuf=None):
+        """
+        Copy frames iFirst..iLast (inclusive) into one contiguous (N, height, width) block.
+        Indexes wrap around the number of frames given to buf_alloc().
+
+        Args:
+            arg1(int): Index of first frame
+            arg2(int): Index of last frame
+            arg3(ndarray): optional preallocated (N, height, width) block, allocated if None
+
+        Returns:
+            npBuf:  NumPy block
+            False:  error happens.  lasterr() returns the DCAMERR value
+        """
+        if not self.is_opened():
+            return self.__result(DCAMERR.INVALIDHANDLE)  # instance is not opened yet.
+
+        nBuffer = self.__bufcount
+        if nBuffer <= 0:
+            return self.__result(DCAMERR.INVALIDFRAMEINDEX)  # buf_alloc() is not called yet.
+        nFrame = (iLast - iFirst) % nBuffer + 1
+
+        if npBuf is None:
+            dtype = dcammisc_frame_dtype(self.__bufframe)
+            if dtype is None:
+                return self.__result(DCAMERR.INVALIDPIXELTYPE)
+            npBuf = np.empty((nFrame, self.__bufframe.height, self.__bufframe.width), dtype=dtype)
+        elif len(npBuf) != nFrame:
+            return self.__result(DCAMERR.INVALIDPARAM)
+
+        for i in range(nFrame):
+            if self.buf_getframe_into((iFirst + i) % nBuffer, npBuf[i]) is False:
+                return False
+
+        return npBuf
+
     # dcamcap functions
 
     def cap_start(self, bSequence=True):
@@ -1,98 +1,211 @@
+# neucams/cams/opencv_cam.py
 import time
+import threading
 import cv2
 import numpy as np
-from multiprocessing import Event
+
 from .generic_cam import GenericCam
-from ..utils import display
+from neucams.utils import display
+
+# params that need the device to be reopened
+_OPEN_PARAMS = ('backend', 'fourcc', 'width', 'height', 'frame_rate')
+
 
 class OpenCVCam(GenericCam):
-    """OpenCV camera; some functionality limited (like hardware triggers)
+    """UVC / OpenCV camera (webcams and so on); no hardware triggers.
+
+    A background thread grabs and decodes frames as they come so the driver
+    buffer never fills up; image() returns the newest frame and skips the
+    stale ones (their ids are missing from the metadata, see 'skipped').
+
+    params:
+        backend: OpenCV capture API ('dshow', 'msmf', 'v4l2'...), None for the default
+        fourcc: pixel format, 'MJPG' lets most webcams reach their rated fps at high resolutions
+        width / height: requested resolution (None keeps the camera default)
+        frame_rate: requested frame rate (0 keeps the camera default)
+        exposure / gain: passed as is to the backend, exposure None is auto exposure
+        gray: convert to a single channel, otherwise frames are RGB
     """
-    def __init__(self,
-                 cam_id = None,
-                 outQ = None,
-                 frame_rate = 0.,
-                 triggered = Event(),
-                 recorderpar = None,
-                 **kwargs):
-
-        super().__init__(name = 'OpenCV', cam_id = cam_id, outQ = outQ, 
-                         recorderpar = recorderpar, 
-                         params = {'frame_rate': float(frame_rate)})
-        
-        self._init_framebuffer()
-        
-        self.triggered = triggered
-        if self.triggered.is_set():
-            display('[OpenCV {0}] Triggered mode ON.'.format(self.cam_id))
-            self.triggerSource = triggerSource
-    
-    def _init_framebuffer(self):
-        self.cam = cv2.VideoCapture(self.cam_id)
-        self.set_cam_settings()
-        ret_val, frame = self.cam.read()
-        if ret_val:
-            self.format['height'] = frame.shape[0]
-            self.format['width'] = frame.shape[1]
-            if len(frame.shape) > 2:
-                self.format['n_chan'] = frame.shape[2]
-            self.format['dtype'] = frame.dtype
-            super()._init_framebuffer()
+    def __init__(self, cam_id=None, params=None, format=None):
+        super().__init__(name='OpenCV', cam_id=0 if cam_id is None else cam_id,
+                         params=params, format=format)
+        default_params = {
+            'backend': None,
+            'fourcc': 'MJPG',
+            'width': None,
+            'height': None,
+            'frame_rate': 0.,
+            'exposure': None,
+            'gain': None,
+            'gray': False,
+        }
+        self.params = {**default_params, **self.params}
+        self.exposed_params = ['frame_rate', 'exposure', 'gain', 'width', 'height', 'fourcc']
+        self.skipped = 0
+        self._lock = threading.Condition()
+        self._grabber = None
+        self._opened = None
+        self._latest = None
+        self._latest_id = -1
+        self._returned_id = -1
+        self._probed = None  # the device is only opened to probe (once) and in __enter__
+
+    def _probe(self):
+        """Opens the device once to read a first frame (connection check and format)"""
+        if self._probed is None:
+            try:
+                self._open()
+                ok, frame = self.cam_handle.read()
+            except RuntimeError as e:
+                display(str(e), level='error')
+                ok = False
+            finally:
+                self._close_handle()
+            self._probed = bool(ok)
+            if ok:
+                self._set_format(self._convert(frame).shape)
+                display(f"{self.name} - size: {self.format['height']} x {self.format['width']}")
+        return self._probed
+
+    def _set_format(self, shape):
+        self.format.update({'dtype': np.dtype(np.uint8), 'height': shape[0], 'width': shape[1],
+                            'n_chan': shape[2] if len(shape) == 3 else 1,
+                            'max_height': shape[0], 'max_width': shape[1]})
+
+    # ------------------------------------------------------------------
+    def _open(self):
+        p = self.params
+        backend = cv2.CAP_ANY
+        if p['backend']:
+            backend = getattr(cv2, 'CAP_' + str(p['backend']).upper(), None)
+            if backend is None:
+                display(f"[OpenCV {self.cam_id}] unknown backend {p['backend']}, using the default",
+                        level='warning')
+                backend = cv2.CAP_ANY
+        cap = cv2.VideoCapture(self.cam_id, backend)
+        if not cap.isOpened():
+            raise RuntimeError(f"[OpenCV {self.cam_id}] could not open the camera")
+        # the fourcc has to be set before the resolution for most drivers
+        if p['fourcc']:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*str(p['fourcc'])[:4].ljust(4)))
+        if p['width']:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, int(p['width']))
+        if p['height']:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, int(p['height']))
+        if p['frame_rate']:
+            cap.set(cv2.CAP_PROP_FPS, float(p['frame_rate']))
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # not supported by all backends, the grab thread keeps up anyway
+        self.cam_handle = cap
+        self._opened = tuple(p[k] for k in _OPEN_PARAMS)
+        self._set_controls()
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if width and height:
+            self._set_format((height, width, 1 if p['gray'] else 3))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+        display(f"[OpenCV {self.cam_id}] opened {width} x {height} @ {cap.get(cv2.CAP_PROP_FPS):.1f} fps ({fourcc})")
+
+    def _set_controls(self):
+        p = self.params
+        if p['exposure'] is None:
+            self.cam_handle.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.75)  # 0.75/0.25 is auto/manual on V4L2 and DSHOW
+        else:
+            self.cam_handle.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.25)
+            self.cam_handle.set(cv2.CAP_PROP_EXPOSURE, float(p['exposure']))
+        if p['gain'] is not None:
+            self.cam_handle.set(cv2.CAP_PROP_GAIN, float(p['gain']))
+
+    def _close_handle(self):
+        if self.cam_handle is not None:
+            self.cam_handle.release()
+            self.cam_handle = None
+
+    def _convert(self, frame):
+        if self.params['gray']:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)[:, :, None]
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    # ------------------------------------------------------------------
+    def probe_format(self):
+        self._probe()
+        return dict(self.format)
+
+    def is_connected(self):
+        return self.cam_handle is not None or self._probe()
+
+    def __enter__(self):
+        self._open()
+        self._record()
+        return self
+
+    def close(self):
+        self.stop()
+        self._close_handle()
+
+    def apply_params(self):
+        if self.cam_handle is None:
+            return
+        if tuple(self.params[k] for k in _OPEN_PARAMS) != self._opened:
+            restart = self.is_recording
+            self.stop()
+            self._close_handle()
+            self._open()
+            if restart:
+                self._record()
         else:
-            display('ERROR: failed to read frame, framebuffer not initialized')
-        self.cam.release()
-        self.cam = None
-    
-    def _init_controls(self):
-        self.ctrevents = dict(framerate=dict(function = 'set_framerate',
-                                             widget = 'float',
-                                             variable = 'frame_rate',
-                                             units = 'fps',
-                                             type = 'float',
-                                             min = 0.0,
-                                             max = 1000,
-                                             step = 0.1))
-    
-    def set_cam_settings(self):
-        self.set_framerate(self.params['frame_rate'])
-        
-    def set_framerate(self,framerate = 30.):
-        '''Set frame rate in seconds'''
-        self.frame_rate = float(framerate)
-        if not self.cam is None:
-            if not float(self.frame_rate) == float(0):
-                self.cam.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.25)
-                self.cam.set(cv2.CAP_PROP_EXPOSURE,1./self.frame_rate)
-                self.cam.set(cv2.CAP_PROP_FPS,self.frame_rate)
-            else:
-                display('[OpenCV] Setting auto exposure.')
-                self.cam.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.75)
-                self.cam.set(cv2.CAP_PROP_EXPOSURE, 100)
-
-            if self.cam_is_running:
-                self.stop_trigger.set()
-                self.start_trigger.set()
-
-            display('[OpenCV {0}] Set frame_rate to: {1}.'.format(self.cam_id,
-                                                                  self.frame_rate))
-
-    def _cam_init(self):
-        self.nframes.value = 0
-        self.lastframeid = -1
-        self.cam = cv2.VideoCapture(self.cam_id)
-        self.set_framerate(self.frame_rate)
-        self.camera_ready.set()
-        
-    def _cam_loop(self):
-        frameID = self.nframes.value
-        self.nframes.value = frameID + 1
-        ret_val, frame = self.cam.read()
-        if not ret_val:
-            return ret_val, None, (None,None)
-        timestamp = time.time()
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        return ret_val, frame,(frameID,timestamp)
-
-    def _cam_close(self):
-        self.cam.release()
-        display('[OpenCV {0}] - Stopped acquisition.'.format(self.cam_id))
+            self._set_controls()
+
+    def get_health_status(self):
+        return {'frames': self._latest_id + 1, 'skipped': self.skipped}
+
+    # ------------------------------------------------------------------
+    def _record(self):
+        if self.is_recording:
+            return
+        self.is_recording = True
+        self._grabber = threading.Thread(target=self._grab_loop, daemon=True)
+        self._grabber.start()
+
+    def stop(self):
+        if not self.is_recording:
+            return
+        self.is_recording = False
+        with self._lock:
+            self._lock.notify_all()
+        if self._grabber is not None:
+            self._grabber.join(2)
+            self._grabber = None
+
+    def _grab_loop(self):
+        frame_id = self._latest_id
+        failures = 0
+        while self.is_recording:
+            if not self.cam_handle.grab():
+                failures += 1
+                if failures == 50:
+                    display(f"[OpenCV {self.cam_id}] camera stopped delivering frames", level='warning')
+                time.sleep(0.01)
+                continue
+            failures = 0
+            timestamp = time.time()
+            frame_id += 1
+            ok, frame = self.cam_handle.retrieve()
+            if not ok:
+                continue
+            frame = self._convert(frame)
+            with self._lock:
+                self._latest = (frame, (frame_id, timestamp))
+                self._latest_id = frame_id
+                self._lock.notify_all()
+
+    def image(self):
+        with self._lock:
+            self._lock.wait_for(lambda: self._latest_id > self._returned_id or not self.is_recording,
+                                timeout=1.)
+            if self._latest_id <= self._returned_id:
+                return None, 'not recording' if not self.is_recording else 'timeout'
+            frame, metadata = self._latest
+            if self._returned_id >= 0:
+                self.skipped += self._latest_id - self._returned_id - 1
+            self._returned_id = self._latest_id
+        return frame, metadata
@@ -0,0 +1,69 @@
+# neucams/cams/registry.py
+# Process-wide cache of the connected cameras, one enumeration per SDK.
+# Enumerating opens a full SDK session (Vimba) or every device (DCAM), so drivers
+# look up serial numbers here instead of walking the bus each time.
+import threading
+from collections import namedtuple
+from importlib import import_module
+
+from neucams.utils import display
+
+DeviceInfo = namedtuple('DeviceInfo', ['driver', 'serial', 'id', 'index', 'model'])
+
+# driver -> (module, function returning [DeviceInfo]); the function takes refresh
+# for SDKs that cache the device list themselves (harvesters)
+ENUMERATORS = {
+    'avt': ('neucams.cams.avt_cam', 'AVT_list_devices'),
+    'genicam': ('neucams.cams.genicam', 'GenI_list_devices'),
+    'hamamatsu': ('neucams.cams.hamamatsu_cam', 'DCAM_list_devices'),
+}
+
+_devices = {}
+_lock = threading.RLock()
+
+
+def list_devices(driver, refresh=False):
+    """Cached [DeviceInfo] for a driver, enumerated on first use or with refresh"""
+    driver = driver.lower()
+    if driver not in ENUMERATORS:
+        return []
+    with _lock:
+        if refresh or driver not in _devices:
+            module_name, function = ENUMERATORS[driver]
+            try:
+                devices = getattr(import_module(module_name), function)(refresh=refresh)
+            except Exception as e:
+                display(f"Could not enumerate {driver} cameras: {e}", level='warning')
+                devices = []
+            _devices[driver] = list(devices)
+            display(f"Found {len(devices)} {driver} camera(s).")
+        return _devices[driver]
+
+
+def find_device(driver, serial_number=None, refresh=False):
+    """DeviceInfo of the camera with serial_number (first camera if None).
+    The bus is enumerated again once if the camera is not in the cache (plugged in later)."""
+    for attempt_refresh in ([True] if refresh else [False, True]):
+        devices = list_devices(driver, refresh=attempt_refresh)
+        if serial_number is None:
+            if devices:
+                return devices[0]
+            continue
+        serial_number = str(serial_number)
+        for dev in devices:
+            if str(dev.serial) == serial_number:
+                return dev
+        # some SDKs decorate the serial (DCAM camera id is 'S/N: 0001234')
+        for dev in devices:
+            if serial_number in str(dev.serial):
+                return dev
+    return None
+
+
+def invalidate(driver=None):
+    """Forget the devices of driver (all drivers if None), e.g. on a hotplug event"""
+    with _lock:
+        if driver is None:
+            _devices.clear()
+        else:
+            _devices.pop(driver.lower(), None)
@@ -0,0 +1,319 @@
+# neucams/cams/replay_cam.py
+import glob
+import mmap
+import os
+import re
+import time
+import queue
+import threading
+import numpy as np
+
+from .generic_cam import GenericCam
+from neucams.utils import display
+
+# BinaryWriter names files {filepath}_{n_chan}_{H}_{W}_{dtype}_{i}.dat
+_DAT_NAME = re.compile(r'_(\d+)_(\d+)_(\d+)_([a-z0-9]+)_\d+\.dat$')
+# TiffWriter stores 'id:{frameid};timestamp:{timestamp}' in each page description
+_TIFF_DESCRIPTION = re.compile(r'id:(-?\d+);timestamp:([0-9.eE+-]+)')
+
+VIDEO_EXTENSIONS = ('.avi', '.mov', '.mp4', '.mkv')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def list_recording(path):
+    """Files of a recording, in order: a single file, a folder or a glob pattern.
+    Files are sorted on modification time, the order in which the writer closed them
+    (split files do not sort on name when the frame format changed during the run)."""
+    if os.path.isdir(path):
+        files = [os.path.join(path, f) for f in os.listdir(path)]
+    elif os.path.isfile(path):
+        return [path]
+    else:
+        files = glob.glob(path)
+    files = [f for f in files if f.lower().endswith(('.dat',) + TIFF_EXTENSIONS + VIDEO_EXTENSIONS)]
+    return sorted(files, key=lambda f: (os.path.getmtime(f), f))
+
+
+class _BinarySource:
+    """BinaryWriter .dat file, memory-mapped. Frames are views on the file."""
+    def __init__(self, path):
+        match = _DAT_NAME.search(os.path.basename(path))
+        if match is None:
+            raise ValueError(f"Can not read the frame format from the filename {path}")
+        n_chan, height, width, dtype = match.groups()
+        self.shape = (int(height), int(width), int(n_chan))
+        self.dtype = np.dtype(dtype)
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.n_frames = os.path.getsize(path) // frame_bytes
+        self.frame_ids = None
+        self.timestamps = None
+        self._mm = np.memmap(path, dtype=self.dtype, mode='r',
+                             shape=(self.n_frames,) + self.shape) if self.n_frames else None
+        if self._mm is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self._mm._mmap.madvise(mmap.MADV_SEQUENTIAL)  # more read-ahead from the OS
+
+    def read(self, i):
+        return self._mm[i].view(np.ndarray)
+
+    def close(self):
+        self._mm = None
+
+
+class _TiffSource:
+    """Multi-page TIFF (TiffWriter), ids and timestamps read from the page descriptions"""
+    def __init__(self, path):
+        from tifffile import TiffFile
+        self._tf = TiffFile(path)
+        self._pages = self._tf.pages
+        self.n_frames = len(self._pages)
+        first = self._pages[0]
+        self.shape = first.shape if len(first.shape) == 3 else tuple(first.shape) + (1,)
+        self.dtype = np.dtype(first.dtype)
+        ids, stamps = [], []
+        for page in self._pages:
+            match = _TIFF_DESCRIPTION.search(getattr(page, 'description', '') or '')
+            if match is None:
+                ids, stamps = None, None
+                break
+            ids.append(int(match.group(1)))
+            stamps.append(float(match.group(2)))
+        self.frame_ids = ids
+        self.timestamps = stamps
+
+    def read(self, i):
+        return self._pages[i].asarray().reshape(self.shape)
+
+    def close(self):
+        self._tf.close()
+
+
+class _VideoSource:
+    """Video file read sequentially with OpenCV, timestamps from the container frame rate"""
+    def __init__(self, path):
+        import cv2
+        self._cv2 = cv2
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise ValueError(f"Could not open video {path}")
+        ok, frame = self._cap.read()
+        if not ok:
+            raise ValueError(f"Could not read a frame from {path}")
+        self._first = frame
+        self._pos = 1
+        self.shape = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+        self.dtype = frame.dtype
+        self.n_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.frame_ids = None
+        self.timestamps = [i / fps for i in range(self.n_frames)] if fps > 0 else None
+
+    def read(self, i):
+        if i == 0:
+            return self._first
+        if i != self._pos:
+            self._cap.set(self._cv2.CAP_PROP_POS_FRAMES, i)
+        ok, frame = self._cap.read()
+        self._pos = i + 1
+        if not ok:
+            return None
+        return frame.reshape(self.shape)
+
+    def close(self):
+        self._cap.release()
+
+
+def open_source(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.dat':
+        return _BinarySource(path)
+    if ext in TIFF_EXTENSIONS:
+        return _TiffSource(path)
+    if ext in VIDEO_EXTENSIONS:
+        return _VideoSource(path)
+    raise ValueError(f"Unknown recording type: {path}")
+
+
+class ReplayCam(GenericCam):
+    """Streams a previous recording (.dat, multi-page TIFF or video) as a live camera.
+
+    params:
+        path: file, folder or glob pattern of the recording (split files are chained)
+        pacing: 'realtime' (recorded timestamps, scaled by speed), 'fixed'
+                (frame_rate) or 'fast' (as fast as the reader goes)
+        loop: restart from the first frame at the end, otherwise the run stops
+        prefetch: frames read ahead by a background thread (0 reads in image())
+
+    Frame ids are the recorded ones when the files have them (TIFF), so gaps in
+    the recording show up downstream. .dat and video files fall back to
+    frame_rate for 'realtime' pacing when no timestamps are available.
+    """
+    def __init__(self, cam_id=None, params=None, format=None):
+        super().__init__(name='Replay', cam_id=cam_id, params=params, format=format)
+        default_params = {
+            'path': None,
+            'pacing': 'realtime',
+            'frame_rate': 30.,
+            'speed': 1.,
+            'loop': False,
+            'prefetch': 16,
+        }
+        self.params = {**default_params, **self.params}
+        if self.params['path'] is None and isinstance(cam_id, str):
+            self.params['path'] = cam_id
+        self.exposed_params = ['pacing', 'frame_rate', 'speed', 'loop']
+        self.files = list_recording(self.params['path'] or '')
+        if not self.files:
+            raise ValueError(f"ReplayCam: no recording found at {self.params['path']}")
+        self.frames_read = 0
+        self._reader = None
+        self._iter = None
+        self._stop_reader = threading.Event()
+        self._init_format()
+
+    # ------------------------------------------------------------------
+    def _init_format(self):
+        # the frame size can change between files (roi / binning during the recording)
+        n_frames, max_height, max_width = 0, 0, 0
+        for path in self.files:
+            source = open_source(path)
+            if not n_frames:
+                self.format.update({'dtype': source.dtype, 'height': source.shape[0],
+                                    'width': source.shape[1], 'n_chan': source.shape[2]})
+            n_frames += source.n_frames
+            max_height, max_width = max(max_height, source.shape[0]), max(max_width, source.shape[1])
+            source.close()
+        self.format.update({'max_height': max_height, 'max_width': max_width})
+        display(f"{self.name} - {len(self.files)} file(s), {n_frames} frames, "
+                f"size: {self.format['height']} x {self.format['width']}")
+
+    def probe_format(self):
+        return dict(self.format)  # known from __init__
+
+    def is_connected(self):
+        return True
+
+    def __enter__(self):
+        self._rewind()
+        self._record()
+        return self
+
+    def close(self):
+        self.stop()
+        self._stop_prefetch()
+
+    def apply_params(self):
+        # pacing restarts from the next frame, waiting for a trigger does not create a burst
+        self._anchor = None
+
+    def get_health_status(self):
+        return {'frames': self.frames_read,
+                'prefetched': self._reader_q.qsize() if self._reader is not None else 0}
+
+    # ------------------------------------------------------------------
+    def _frames(self):
+        """Yields (frame, frame_id, recorded timestamp or None) through all the files"""
+        offset = 0
+        for path in self.files:
+            try:
+                source = open_source(path)
+            except Exception as e:
+                display(f"{self.name}: skipping {path}: {e}", level='warning')
+                continue
+            try:
+                for i in range(source.n_frames):
+                    if self._stop_reader.is_set():
+                        return
+                    frame = source.read(i)
+                    if frame is None:
+                        break
+                    frame_id = source.frame_ids[i] if source.frame_ids else offset + i
+                    stamp = source.timestamps[i] if source.timestamps else None
+                    yield frame, frame_id, stamp
+                offset += source.n_frames
+            finally:
+                source.close()
+
+    def _prefetch(self):
+        for item in self._frames():
+            while not self._stop_reader.is_set():
+                try:
+                    self._reader_q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+        self._reader_q.put(None)
+
+    def _stop_prefetch(self):
+        if self._reader is not None:
+            self._stop_reader.set()
+            while self._reader.is_alive():
+                try:
+                    self._reader_q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._reader = None
+        self._iter = None
+
+    def _rewind(self):
+        self._stop_prefetch()
+        self._stop_reader.clear()
+        self._anchor = None
+        self._last_t = 0.
+        self._n_paced = 0
+        if self.params['prefetch'] > 0:
+            self._reader_q = queue.Queue(maxsize=int(self.params['prefetch']))
+            self._reader = threading.Thread(target=self._prefetch, daemon=True)
+            self._reader.start()
+        else:
+            self._iter = self._frames()
+
+    def _next(self):
+        if self._reader is not None:
+            return self._reader_q.get()
+        return next(self._iter, None)
+
+    # ------------------------------------------------------------------
+    def _record(self):
+        self.is_recording = True
+
+    def stop(self):
+        self.is_recording = False
+
+    def image(self):
+        if not self.is_recording:
+            return None, 'not recording'
+        item = self._next()
+        if item is None:
+            self._rewind()
+            if not self.params['loop']:
+                display(f"{self.name}: end of recording.")
+                return None, 'stop'
+            item = self._next()
+            if item is None:
+                return None, 'stop'
+        frame, frame_id, stamp = item
+        self._pace(stamp)
+        self.frames_read += 1
+        return frame, (frame_id, time.time())
+
+    def _pace(self, stamp):
+        pacing = self.params['pacing']
+        if pacing == 'fast':
+            return
+        speed = float(self.params['speed']) or 1.
+        if pacing == 'realtime' and stamp is not None:
+            t = stamp / speed
+        else:
+            rate = float(self.params['frame_rate']) * speed
+            if rate <= 0:
+                return
+            t = self._n_paced / rate
+        self._n_paced += 1
+        now = time.perf_counter()
+        # anchor at start, after a pause or when timestamps go back (loop, new recording)
+        if self._anchor is None or t < self._last_t:
+            self._anchor = now - t
+        self._last_t = t
+        delay = self._anchor + t - now
+        if delay > 0:
+            time.sleep(delay)
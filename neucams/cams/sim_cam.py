@@ -0,0 +1,179 @@
+# neucams/cams/sim_cam.py
+import time
+import numpy as np
+
+from .generic_cam import GenericCam, get_format_params
+from neucams.utils import display
+
+COUNTER_BITS = 32
+COUNTER_PX = 2  # each counter bit is a COUNTER_PX x COUNTER_PX block in the top-left corner
+
+
+def read_counter(frame):
+    """Decodes the frame id stamped in a SimCam frame (embed_counter)."""
+    frame = np.asarray(frame)
+    row = frame.reshape(frame.shape[0], frame.shape[1], -1)[0, :COUNTER_BITS * COUNTER_PX:COUNTER_PX, 0]
+    bits = row > _full_scale(frame.dtype) / 2
+    return int(np.sum(bits.astype(np.int64) << np.arange(len(bits), dtype=np.int64)))
+
+
+def _full_scale(dtype):
+    """White level: the dtype range for integers, 1 for floats"""
+    return np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1.
+
+
+class SimCam(GenericCam):
+    """Synthetic camera generating deterministic frames without hardware.
+
+    Patterns: 'gradient' (scrolling ramp), 'moving' (drifting diagonal bars)
+    and 'noise' (cycles through a bank of random frames). Frames are paced at
+    frame_rate (0 runs as fast as possible) with optional gaussian jitter
+    (jitter_ms) and random drops (drop_rate, dropped ids are skipped in the
+    metadata). The frame id can be stamped in the top-left corner (see
+    read_counter). roi / binning / decimation crop and stride the sensor image.
+    dtype is an integer type (full range) or a float type (0-1).
+    """
+    def __init__(self, cam_id=None, params=None, format=None):
+        super().__init__(name='Sim', cam_id=cam_id, params=params, format=format)
+        default_params = {
+            'width': 640,
+            'height': 480,
+            'dtype': 'uint8',
+            'n_chan': 1,
+            'frame_rate': 30.,
+            'pattern': 'moving',
+            'speed': 4,          # px per frame for the scrolling patterns
+            'jitter_ms': 0.,
+            'drop_rate': 0.,
+            'embed_counter': True,
+            'seed': 0,
+        }
+        self.params = {**default_params, **self.params}
+        self.exposed_params = ['frame_rate', 'pattern', 'speed', 'jitter_ms', 'drop_rate',
+                               'embed_counter', 'roi', 'binning', 'decimation']
+        self.dropped = 0
+        self._source = None
+        self._built = None
+        self.apply_params()
+
+    # ------------------------------------------------------------------
+    def probe_format(self):
+        return dict(self.format)  # known from __init__
+
+    def is_connected(self):
+        return True
+
+    def __enter__(self):
+        self.apply_params()
+        self._record()
+        return self
+
+    def close(self):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    def apply_params(self):
+        p = self.params
+        key = (p['width'], p['height'], p['dtype'], p['n_chan'], p['pattern'], p['seed'],
+               repr(get_format_params(p)))
+        if key == self._built:
+            return
+        self._build_source()
+        self._built = key
+
+    def _build_source(self):
+        p = self.params
+        height, width, n_chan = int(p['height']), int(p['width']), int(p['n_chan'])
+        dtype = np.dtype(p['dtype'])
+        if not np.issubdtype(dtype, np.integer) and not np.issubdtype(dtype, np.floating):
+            raise ValueError(f"SimCam: dtype should be an integer or float type, not '{p['dtype']}'")
+        vmax = _full_scale(dtype)
+        rng = np.random.default_rng(p['seed'])
+        pattern = p['pattern']
+        if pattern == 'noise':
+            # bank of frames, frame k shows bank[k % 16]
+            size = (16, height, width, n_chan)
+            if np.issubdtype(dtype, np.integer):
+                self._source = rng.integers(0, vmax, size=size, dtype=dtype, endpoint=True)
+            else:
+                self._source = rng.random(size).astype(dtype)
+            self._period = 0
+        else:
+            if pattern == 'gradient':
+                period = width
+                x = np.arange(width + period)
+                line = (x % period) * (vmax / max(1, period - 1))
+                img = np.broadcast_to(line[None, :], (height, width + period))
+            else:
+                if pattern != 'moving':
+                    display(f"SimCam: unknown pattern '{pattern}', using 'moving'", level='warning')
+                period = 64
+                y, x = np.mgrid[0:height, 0:width + period]
+                img = (np.sin(2 * np.pi * (x + y) / period) + 1) * (vmax / 2)
+            # scrolling patterns are views on a source wider by one period
+            self._source = np.repeat(img.astype(dtype)[:, :, None], n_chan, axis=2)
+            self._period = period
+
+        roi, binning, decimation = get_format_params(p)
+        x0, y0, w, h = roi if roi is not None else [0, 0, None, None]
+        x0, y0 = min(x0, width - 1), min(y0, height - 1)
+        w = width - x0 if w is None else min(w, width - x0)
+        h = height - y0 if h is None else min(h, height - y0)
+        step = max(1, binning * decimation)
+        self._crop = (slice(y0, y0 + h, step), slice(x0, x0 + w, step))
+        out_h, out_w = len(range(y0, y0 + h, step)), len(range(x0, x0 + w, step))
+
+        self._stamp = p['embed_counter'] and out_w >= COUNTER_BITS * COUNTER_PX and out_h >= COUNTER_PX
+        if p['embed_counter'] and not self._stamp:
+            display("SimCam: frame too small to embed the frame counter", level='warning')
+        self._vmax = vmax
+        self._rng = rng
+        self.format.update({'dtype': dtype, 'height': out_h, 'width': out_w, 'n_chan': n_chan,
+                            'max_height': height, 'max_width': width})
+
+    # ------------------------------------------------------------------
+    def _record(self):
+        self._next_id = 0
+        self._t_start = time.perf_counter()
+        self.is_recording = True
+
+    def stop(self):
+        self.is_recording = False
+
+    def get_health_status(self):
+        return {'frames': getattr(self, '_next_id', 0), 'dropped': self.dropped}
+
+    def image(self):
+        if not self.is_recording:
+            return None, 'not recording'
+        p = self.params
+        frame_id = self._next_id
+        while p['drop_rate'] > 0 and self._rng.random() < p['drop_rate']:
+            frame_id += 1
+            self.dropped += 1
+        self._next_id = frame_id + 1
+
+        if p['frame_rate'] > 0:
+            deadline = self._t_start + frame_id / p['frame_rate']
+            if p['jitter_ms'] > 0:
+                deadline += self._rng.normal(0, p['jitter_ms'] / 1000.)
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        frame = self._render(frame_id)
+        return frame, (frame_id, time.time())
+
+    def _render(self, frame_id):
+        if self._period:
+            offset = (frame_id * int(self.params['speed'])) % self._period
+            src = self._source[:, offset:offset + self.params['width']]
+        else:
+            src = self._source[frame_id % len(self._source)]
+        # a new array per frame: the writer queue pickles the frame later, in its feeder thread
+        out = np.array(src[self._crop])
+        if self._stamp:
+            bits = (frame_id >> np.arange(COUNTER_BITS)) & 1
+            block = np.repeat(bits * self._vmax, COUNTER_PX).astype(out.dtype)
+            out[:COUNTER_PX, :COUNTER_BITS * COUNTER_PX] = block[None, :, None]
+        return out
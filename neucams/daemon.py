@@ -0,0 +1,152 @@
+# neucams/daemon.py
+# Headless acquisition: camera handlers controlled over UDP, no Qt.
+# python -m neucams --headless -p config.json
+import sys
+import os
+import logging
+from argparse import ArgumentParser
+
+from neucams.camera_handler import CameraFactory, init_cam_handlers
+from neucams.tracking import init_tracker
+from neucams.udp_socket import UDPSocket
+from neucams.utils import display, get_preferences, check_preferences
+
+
+class AcquisitionDaemon:
+    """Starts the cameras of a preferences dict and serves the UDP control protocol
+    of the GUI (ping, folder, start, stop, done?, quit) from a plain loop.
+
+    Without a viewer 'start' starts every camera (and saves when record is True),
+    the UDP server listens on server_params or 0.0.0.0:9999.
+    """
+    def __init__(self, prefs, record=True):
+        self.prefs = prefs
+        self.record = record
+        self.cam_handlers = []
+        self.trackers = []
+        self.server = None
+        self._quit = False
+
+    def start(self):
+        valid_drivers = list(CameraFactory.cameras.keys())
+        cams = [cam for cam in self.prefs.get('cams', []) if cam.get('driver', '').lower() in valid_drivers]
+        self.cam_handlers = [cam_handler for _, cam_handler in init_cam_handlers(cams, self.prefs)]
+        for cam_handler in self.cam_handlers:
+            tracker = init_tracker(cam_handler)
+            cam_handler.start()
+            if tracker is not None:
+                tracker.start()
+                self.trackers.append(tracker)
+        server_params = self.prefs.get('server_params', None) or {}
+        address = (server_params.get('server_ip', '0.0.0.0'), server_params.get('server_port', 9999))
+        self.server = UDPSocket(address)
+        display(f"neucams headless: {len(self.cam_handlers)} camera(s), UDP {address[0]}:{address[1]}")
+
+    def serve_forever(self):
+        try:
+            while not self._quit:
+                ret, msg, address = self.server.receive()  # 20 ms timeout
+                if ret:
+                    self.process_message(msg, address)
+        except KeyboardInterrupt:
+            display("Interrupted.")
+        finally:
+            self.close()
+
+    # ------------------------------------------------------------------
+    def process_message(self, msg, address):
+        action, *value = msg.split('=')
+        action = action.strip().lower()  # values (descriptions, paths) keep their case
+
+        if action == 'ping':
+            display(f'Server got pinged [{address}]')
+            self.server.send('pong', address)
+
+        elif action == 'folder':
+            self.set_folder_path(value[0] if value else '')
+            display(f'Folder changed to {value} [{address}]')
+            self.server.send('ok=folder', address)
+
+        elif action == 'start':
+            display(f'Starting cameras [{address}]')
+            self.start_cams()
+            self.server.send('ok=start', address)
+
+        elif action == 'stop':
+            display(f'Stopping cameras [{address}]')
+            for cam_handler in self.cam_handlers:
+                cam_handler.stop_acquisition()
+            self.server.send('ok=stop', address)
+
+        elif action == 'done?':
+            cam_descr = value[0] if value else ''
+            for cam_handler in self.cam_handlers:
+                if cam_handler.cam_dict.get('description') == cam_descr:
+                    status = cam_handler.is_acquisition_done.is_set()
+                    self.server.send(f'done?={status}', address)
+                    return
+            self.server.send('done?=camera not found', address)
+
+        elif action == 'quit':
+            display(f'Exiting [{address}]')
+            self.server.send('ok=bye', address)
+            self._quit = True
+
+    def set_folder_path(self, save_path):
+        if os.path.sep == '/':
+            save_path = save_path.replace('\\', os.path.sep)
+        save_path = save_path.strip(' ')
+        for cam_handler in self.cam_handlers:
+            cam_handler.set_folder_path(save_path)
+
+    def start_cams(self, timeout=5.):
+        for cam_handler in self.cam_handlers:
+            # ready once the previous run is closed
+            if not cam_handler.camera_ready.wait(timeout):
+                display(f"Camera {cam_handler.cam_dict.get('description')} not ready", level='warning')
+                continue
+            if self.record:
+                cam_handler.start_saving()
+            else:
+                cam_handler.stop_saving()
+            cam_handler.start_acquisition()
+
+    def close(self):
+        for cam_handler in self.cam_handlers:
+            cam_handler.close()
+        for tracker in self.trackers:
+            tracker.close()
+        if self.server is not None:
+            self.server.socket.close()
+            self.server = None
+        display("neucams headless out, bye!")
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='neucams headless acquisition, controlled over UDP.')
+    parser.add_argument('-p', '--pref', metavar='preference', type=str, required=True,
+                        help='Preference filename')
+    parser.add_argument('--no-record', action='store_true', help='Do not save the frames on start')
+    args = parser.parse_args(argv)
+    run(args.pref, record=not args.no_record)
+
+
+def run(pref_path, record=True):
+    logging.getLogger().setLevel(logging.INFO)  # utils configures WARNING
+    ret, prefs = get_preferences(pref_path, create_template=False)
+    if ret is not True:
+        display(ret if isinstance(ret, str) else f'Could not load preferences {pref_path}', level='error')
+        sys.exit(1)
+    error_message = check_preferences(prefs, valid_drivers=list(CameraFactory.cameras.keys()))
+    if error_message:
+        display(error_message, level='error')
+        sys.exit(1)
+    daemon = AcquisitionDaemon(prefs, record=record)
+    daemon.start()
+    daemon.serve_forever()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
@@ -11,6 +11,7 @@ from tifffile import imread, TiffFile, TiffWriter as twriter
 from skvideo.io import FFmpegWriter
 import cv2
 from neucams.utils import display
+from neucams.frame_ring import FrameRing, FrameRef
 from multiprocessing import shared_memory
 
 VERSION = 'B0.6'
@@ -67,8 +68,10 @@ class FileWriter(Process):
         self.is_run_closed = Event()
         
         self.inQ = Queue()
+        self._rings = {}  # shared capture rings mapped by this process, by name
 
         self.file_handler = None
+        self._file_shape = None
         self.start()
         self.start_flag.wait() #do not return handle before process started
 
@@ -115,6 +118,9 @@ class FileWriter(Process):
     def _init_file_handler(self, frame):
         """open file generic"""
         self.filepath = self.get_filepath()
+        if isfile(self.filepath):
+            # file split within a run (frames_per_file, format change): take the next index
+            self.filepath = self.get_complete_filepath(self.filepath.rsplit('_', 1)[0])
         folder = dirname(self.filepath)
         if not os.path.exists(folder):
             try:
@@ -123,6 +129,7 @@ class FileWriter(Process):
                 print(f"Could not create folder {folder} : {e}")
         self._release_file_handler()
         self.file_handler = self._get_file_handler(self.filepath,frame)
+        self._file_shape = frame.shape
         
     def _get_file_handler(self, filepath, frame):
         """get specific file handler"""
@@ -139,11 +146,10 @@ class FileWriter(Process):
         pass
 
     def save(self,frame,metadata):
+        # frames living in a shared ring are sent by reference, not pickled
+        if len(metadata) > 2 and isinstance(metadata[2], FrameRef):
+            frame, metadata = metadata[2], metadata[:2]
         try:
-            # QUEUE DEBUG
-            import numpy as np
-            # Remove type/shape debug prints
-            debug_pickle((frame,metadata), 'QUEUE PAYLOAD')
             self.inQ.put((frame,metadata), timeout = self.queue_timeout)
         except queue.Full:
             print("ERROR: could not save image, queue is full")
@@ -153,6 +159,8 @@ class FileWriter(Process):
         self.start_flag.set()
         while not self.close_flag.is_set():
             self.saved_frame_count = 0
+            self.n_overrun = 0  # ring frames skipped (overwritten before they were written)
+            self.n_torn = 0     # ring frames overwritten while they were written
             while not self.stop_flag.is_set():
                 time.sleep(self.sleeptime)
                 self._process_queue()
@@ -160,6 +168,10 @@ class FileWriter(Process):
     
     def _close_run(self):
         self._release_file_handler()
+        self._release_rings()
+        if self.n_overrun or self.n_torn:
+            display(f"[Writer] {self.n_overrun} frames skipped and {self.n_torn} corrupted by "
+                    f"capture ring overruns at {self.filepath}", level='warning')
         # if not self.saved_frame_count == 0:
             # display("[Writer] Wrote {0} frames at {1}.".format(self.saved_frame_count,
                                                                # self.filepath))
@@ -180,29 +192,69 @@ class FileWriter(Process):
     def _handle_frame(self, buff):
         # print(buff, flush=True)
         frame, metadata = buff
+        # Frame read in place from a shared capture ring
+        if isinstance(frame, FrameRef):
+            try:
+                ring = self._get_ring(frame)
+            except FileNotFoundError:
+                display(f"[Writer] capture ring gone, dropped frame {metadata[0]}", level='warning')
+                return
+            # the slot is reused once the camera went around the ring: never write
+            # another frame under this id, skip it as an overrun
+            if not ring.is_valid(frame):
+                self._ring_overrun(metadata[0])
+                return
+            self._write_frame(ring.frames[frame.slot], metadata)
+            if not ring.is_valid(frame):  # overwritten during the write
+                if self._discard_last():
+                    self.saved_frame_count -= 1
+                    self._ring_overrun(metadata[0])
+                else:
+                    self.n_torn += 1
+                    display(f"[Writer] frame {metadata[0]} was overwritten in the capture ring "
+                            "while it was written, the saved frame is corrupted", level='error')
         # Handle shared memory tuple from AVT
-        if isinstance(frame, tuple) and len(frame) == 3 and isinstance(frame[0], str):
+        elif isinstance(frame, tuple) and len(frame) == 3 and isinstance(frame[0], str):
             shm_name, shape, dtype = frame
             frame, shm = shm_frame(shm_name, shape, dtype)
             try:
-                if (self.file_handler is None or
-                    (self.frames_per_file > 0 and np.mod(self.saved_frame_count,
-                                                       self.frames_per_file)==0)):
-                    self._init_file_handler(frame)
-                frameid, timestamp = metadata[:2]
-                self._write(frame, frameid, timestamp)
-                self.saved_frame_count += 1
+                self._write_frame(frame, metadata)
             finally:
                 shm.close()
                 shm.unlink()
         else:
-            if (self.file_handler is None or
-                (self.frames_per_file > 0 and np.mod(self.saved_frame_count,
-                                                   self.frames_per_file)==0)):
-                self._init_file_handler(frame)
-            frameid, timestamp = metadata[:2] 
-            self._write(frame,frameid,timestamp)
-            self.saved_frame_count += 1
+            self._write_frame(frame, metadata)
+
+    def _write_frame(self, frame, metadata):
+        # a new file is started when the frame format changes (roi, binning...)
+        if (self.file_handler is None or frame.shape != self._file_shape or
+            (self.frames_per_file > 0 and np.mod(self.saved_frame_count,
+                                               self.frames_per_file)==0)):
+            self._init_file_handler(frame)
+        frameid, timestamp = metadata[:2]
+        self._write(frame,frameid,timestamp)
+        self.saved_frame_count += 1
+
+    def _ring_overrun(self, frameid):
+        self.n_overrun += 1
+        if self.n_overrun == 1:
+            display(f"[Writer] frame {frameid} was overwritten in the capture ring before it was "
+                    "written and is skipped, increase n_buffers", level='warning')
+
+    def _discard_last(self):
+        """Removes the last written frame from the file, False if the format can not"""
+        return False
+
+    def _get_ring(self, ref):
+        ring = self._rings.get(ref.name)
+        if ring is None:
+            ring = self._rings[ref.name] = FrameRing.from_ref(ref)
+        return ring
+
+    def _release_rings(self):
+        for ring in self._rings.values():
+            ring.close()
+        self._rings = {}
                 
     def close(self):
         self.close_flag.set()
@@ -242,6 +294,12 @@ class BinaryWriter(FileWriter):
         super().__init__(filepath = filepath + "_{n_chan}_{H}_{W}_{dtype}",
                          frames_per_file=frames_per_file,
                          extension = 'dat')
+
+    def set_filepath(self, filepath):
+        # the frame format is only known when the file is opened
+        if not filepath.endswith("_{n_chan}_{H}_{W}_{dtype}"):
+            filepath = filepath + "_{n_chan}_{H}_{W}_{dtype}"
+        super().set_filepath(filepath)
         
     def _get_file_handler(self,filepath,frame = None):
         dtype = frame.dtype
@@ -251,18 +309,26 @@ class BinaryWriter(FileWriter):
             dtype='uint8'
         else:
             dtype='uint16'
-        filepath = filepath.format(n_chan = frame.shape[2],
+        filepath = filepath.format(n_chan = frame.shape[2] if frame.ndim == 3 else 1,
                                         W = frame.shape[1],
                                         H = frame.shape[0],
                                     dtype = dtype)
+        if isfile(filepath):
+            filepath = self.get_complete_filepath(filepath.rsplit('_', 1)[0])
         display('Opening: '+ filepath)
         return open(filepath,'wb')
         
     def _write(self,frame,frameid,timestamp):
+        self._last_pos = self.file_handler.tell()
         self.file_handler.write(frame)
         if np.mod(frameid,5000) == 0: 
             display('Wrote frame id - {0}'.format(frameid))
         
+    def _discard_last(self):
+        self.file_handler.seek(self._last_pos)
+        self.file_handler.truncate()
+        return True
+
 class FFMPEGWriter(FileWriter):
     def __init__(self, filepath,
                        frames_per_file=0,
@@ -0,0 +1,193 @@
+# Frames kept in a named shared-memory block that several processes map,
+# so only a small FrameRef has to travel through the queues.
+from collections import namedtuple
+from multiprocessing import shared_memory
+import ctypes
+import time
+import numpy as np
+
+_HEADER_BYTES = 4096  # keeps the slots page aligned
+
+FrameRef = namedtuple('FrameRef', ['name', 'n_slots', 'shape', 'dtype', 'slot', 'count'])
+
+
+class FrameRing:
+    """Ring of n_slots frames of identical shape and dtype in shared memory.
+
+    The header holds the number of frames written so far; readers compare it
+    with the count stored in a FrameRef to know if the slot was overwritten.
+    Pass name to map a ring created by another process.
+    """
+    def __init__(self, n_slots, shape, dtype, name=None):
+        self.n_slots = int(n_slots)
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            size = _HEADER_BYTES + self.n_slots * self.frame_bytes
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._count = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((self.n_slots,) + self.shape, dtype=self.dtype,
+                                 buffer=self.shm.buf, offset=_HEADER_BYTES)
+        if self.owner:
+            self._count[0] = 0
+
+    def __reduce__(self):
+        # pickled (spawned processes) as a mapping of the same block, never the frames
+        return (FrameRing, (self.n_slots, self.shape, self.dtype.str, self.name))
+
+    @classmethod
+    def from_ref(cls, ref):
+        return cls(ref.n_slots, ref.shape, ref.dtype, name=ref.name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+    def set_count(self, count):
+        self._count[0] = count
+
+    def ref(self, slot, count):
+        return FrameRef(self.name, self.n_slots, self.shape, self.dtype.str, int(slot), int(count))
+
+    def is_valid(self, ref):
+        """True if the slot still holds the frame ref points to.
+        One slot of margin is kept for the frame the producer may be filling."""
+        return self.count - ref.count < self.n_slots - 1
+
+    def slot_pointers(self):
+        """ctypes array with the address of every slot (e.g. for dcambuf_attach)"""
+        base = self.frames.ctypes.data
+        return (ctypes.c_void_p * self.n_slots)(*[base + i * self.frame_bytes
+                                                 for i in range(self.n_slots)])
+
+    def close(self):
+        self._count = None
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class StreamFrame:
+    """A frame of a CameraStream. array is a read-only view into the shared ring,
+    valid until release() (the handler does not reuse the slot before)."""
+    __slots__ = ('array', 'frame_id', 'timestamp', 'index', '_stream')
+
+    def __init__(self, array, frame_id, timestamp, index, stream):
+        self.array = array
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.index = index
+        self._stream = stream
+
+    def release(self):
+        if self._stream is not None:
+            self._stream._release(self.index)
+            self._stream = None
+            self.array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class CameraStream:
+    """Iterator over the frames a CameraHandler publishes to a stream ring
+    (ring, channel from cam_handler.enable_stream), until closed is set.
+
+    Frames are views into shared memory, no copy is made on this side.
+    Released frames free their slot for the handler; when the ring is full of
+    frames not yet released the handler drops frames from the stream (counted in
+    dropped), acquisition and saving are not affected.
+
+    max_lag: when more than max_lag frames wait to be read, the stream jumps to
+             the newest one (the skipped frames are released and counted in
+             skipped). None yields every published frame.
+    auto_release: the previous frame is released when the next one is requested,
+                  otherwise call frame.release() (or use it as a context manager).
+    """
+    def __init__(self, ring, channel, closed, max_lag=None, auto_release=True, timeout=None):
+        self.ring = ring
+        self.channel = channel
+        self.closed = closed
+        self.max_lag = max_lag
+        self.auto_release = auto_release
+        self.timeout = timeout
+        self.skipped = 0
+        self._next = ring.count  # only frames published from now on
+        self._held = set()
+        self._released_to = self._next
+        self._last = None
+        channel.released.value = self._next
+
+    @property
+    def dropped(self):
+        return self.channel.dropped.value
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        frame = self.read(timeout=self.timeout)
+        if frame is None:
+            raise StopIteration
+        return frame
+
+    def read(self, timeout=None):
+        """Next frame, None on timeout or when the handler is closed"""
+        if self.auto_release and self._last is not None:
+            self._last.release()
+        self._last = None
+        tstart = time.perf_counter()
+        while self.ring.count <= self._next:
+            if self.closed.is_set():
+                return None
+            if timeout is not None and time.perf_counter() - tstart > timeout:
+                return None
+            time.sleep(0.0002)
+        count = self.ring.count
+        if self.max_lag is not None and count - self._next > self.max_lag:
+            newest = count - 1
+            for index in range(self._next, newest):
+                self._held.add(index)
+                self._release(index)
+            self.skipped += newest - self._next
+            self._next = newest
+        index = self._next
+        self._next += 1
+        slot = index % self.ring.n_slots
+        frame_id, timestamp, height, width, n_chan = self.channel.meta[slot * 5:(slot + 1) * 5]
+        array = self.ring.frames[slot, :int(height), :int(width), :int(n_chan)]
+        array.flags.writeable = False
+        self._held.add(index)
+        frame = StreamFrame(array, int(frame_id), timestamp, index, self)
+        if self.auto_release:
+            self._last = frame
+        return frame
+
+    def _release(self, index):
+        self._held.discard(index)
+        # the handler only needs the oldest frame still held
+        released = min(self._held) if self._held else self._next
+        if released > self._released_to:
+            self._released_to = released
+            self.channel.released.value = released
+
+    def close(self):
+        if self._last is not None:
+            self._last.release()
+        self._held.clear()
+        self.channel.released.value = self._next
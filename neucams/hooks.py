@@ -0,0 +1,195 @@
+# neucams/hooks.py
+# User processing run by the CameraHandler on every frame, at the camera rate.
+#
+# cam_dict:
+#   "hooks": ["mypackage.analysis:motion_energy",
+#             {"function": "mypackage.analysis:Threshold", "batch": 8, "workers": 1,
+#              "params": {"level": 200}}]
+#
+# A function is called as function(frames, frame_ids, timestamps, **params) with
+# frames a contiguous (batch, H, W, n_chan) array. A class is instantiated with
+# params and the instance is called the same way (without params); its close()
+# is called at the end of each run.
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+import numpy as np
+
+from neucams.utils import display
+
+
+def load_callable(spec):
+    """'package.module:name' -> the object"""
+    module_name, _, name = spec.partition(':')
+    if not name:
+        raise ValueError(f"Hook '{spec}' should be 'module:function'")
+    obj = import_module(module_name)
+    for attr in name.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class FrameHook:
+    """One hook of a camera: batches frames, calls the function inline or in a
+    thread pool (workers > 0) and keeps timing statistics.
+
+    Batches that can not be handed to a busy pool are dropped and counted (the
+    camera loop never waits); hooks slower than the camera are reported.
+    """
+    def __init__(self, spec, cam_name=''):
+        if isinstance(spec, str):
+            spec = {'function': spec}
+        self.name = spec['function']
+        self.cam_name = cam_name
+        self.batch = max(1, int(spec.get('batch', 1)))
+        self.workers = int(spec.get('workers', 0))
+        params = spec.get('params', {}) or {}
+        target = load_callable(self.name)
+        if isinstance(target, type):
+            self._instance = target(**params)
+            self._function, self._params = self._instance, {}
+        else:
+            self._instance = None
+            self._function, self._params = target, params
+        self._pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        self._max_pending = 2 * self.workers
+        self._pending = []
+        self._free = []      # batch buffers not in use
+        self._frames = None  # buffer being filled
+        self._ids = None
+        self._stamps = None
+        self._n = 0
+        self._lock = threading.Lock()  # stats, updated from the pool threads
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.n_calls = 0
+        self.n_frames = 0
+        self.n_dropped = 0
+        self.n_errors = 0
+        self.time_total = 0.
+        self.time_max = 0.
+        self._t_first = None
+        self._n_pushed = 0
+        self._warned_slow = False
+        self._run_active = False
+
+    # ------------------------------------------------------------------
+    def push(self, frame, metadata):
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        if self._frames is not None and (self._frames.shape[1:] != frame.shape
+                                         or self._frames.dtype != frame.dtype):
+            self.flush()  # frame format changed (roi, binning), new buffers below
+            self._frames = self._ids = self._stamps = None
+        if self._frames is None:
+            self._frames, self._ids, self._stamps = self._new_buffers(frame)
+        self._frames[self._n] = frame
+        self._ids[self._n] = metadata[0]
+        self._stamps[self._n] = metadata[1]
+        self._n += 1
+        if self._t_first is None:
+            self._t_first = time.perf_counter()
+            self._run_active = True
+        self._n_pushed += 1
+        if self._n == self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self._n:
+            return
+        buffers = (self._frames[:self._n], self._ids[:self._n], self._stamps[:self._n])
+        if self._pool is None:
+            self._call(*buffers)
+            self._n = 0  # buffers reused
+            return
+        self._pending = [f for f in self._pending if not f.done()]
+        if len(self._pending) >= self._max_pending:
+            self.n_dropped += self._n
+            if self.n_dropped == self._n:
+                display(f"[{self.cam_name}] hook {self.name} can not keep up, dropping frames", level='warning')
+            self._n = 0
+            return
+        full = (self._frames, self._ids, self._stamps)
+        future = self._pool.submit(self._call, *buffers)
+        future.add_done_callback(lambda _, full=full: self._free.append(full))
+        self._pending.append(future)
+        self._frames = self._ids = self._stamps = None
+        self._n = 0
+
+    def _new_buffers(self, frame):
+        while self._free:
+            buffers = self._free.pop()
+            if buffers[0].shape[1:] == frame.shape and buffers[0].dtype == frame.dtype:
+                return buffers
+        return (np.empty((self.batch,) + frame.shape, dtype=frame.dtype),
+                np.empty(self.batch, dtype=np.int64), np.empty(self.batch, dtype=np.float64))
+
+    def _call(self, frames, frame_ids, timestamps):
+        t = time.perf_counter()
+        try:
+            self._function(frames, frame_ids, timestamps, **self._params)
+        except Exception as e:
+            with self._lock:
+                self.n_errors += 1
+            if self.n_errors == 1:
+                display(f"[{self.cam_name}] hook {self.name} failed: {e}", level='error')
+        elapsed = time.perf_counter() - t
+        with self._lock:
+            self.n_calls += 1
+            self.n_frames += len(frames)
+            self.time_total += elapsed
+            self.time_max = max(self.time_max, elapsed)
+            self._check_speed()
+
+    def _check_speed(self):
+        if self._warned_slow or self.n_calls < 10 or self._n_pushed < 2:
+            return
+        frame_period = (time.perf_counter() - self._t_first) / (self._n_pushed - 1)
+        per_frame = self.time_total / self.n_frames
+        if per_frame > frame_period:
+            self._warned_slow = True
+            display(f"[{self.cam_name}] hook {self.name} takes {per_frame * 1e3:.2f} ms per frame, "
+                    f"frames arrive every {frame_period * 1e3:.2f} ms", level='warning')
+
+    # ------------------------------------------------------------------
+    def stats(self):
+        mean = self.time_total / self.n_calls if self.n_calls else 0.
+        return {'calls': self.n_calls, 'frames': self.n_frames, 'dropped': self.n_dropped,
+                'errors': self.n_errors, 'mean_ms': mean * 1e3, 'max_ms': self.time_max * 1e3}
+
+    def close_run(self):
+        """Flushes the last batch, waits for the pool and reports the timing of the run"""
+        if not self._run_active:
+            return
+        self.flush()
+        for future in self._pending:
+            future.result()
+        self._pending = []
+        if self._instance is not None and hasattr(self._instance, 'close'):
+            self._instance.close()
+        if self.n_calls:
+            s = self.stats()
+            display(f"[{self.cam_name}] hook {self.name}: {s['frames']} frames in {s['calls']} calls, "
+                    f"{s['mean_ms']:.2f} ms mean, {s['max_ms']:.2f} ms max per call, "
+                    f"{s['dropped']} dropped, {s['errors']} errors",
+                    level='warning' if s['dropped'] or s['errors'] else 'info')
+        self.reset_stats()
+
+    def close(self):
+        self.close_run()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+
+def load_hooks(cam_dict):
+    """FrameHooks of the 'hooks' entry of a camera; hooks that do not load are skipped"""
+    hooks = []
+    for spec in cam_dict.get('hooks', []) or []:
+        try:
+            hooks.append(FrameHook(spec, cam_dict.get('description', '')))
+        except Exception as e:
+            display(f"[{cam_dict.get('description', '')}] could not load hook {spec}: {e}", level='error')
+    return hooks
@@ -0,0 +1,172 @@
+# neucams/rois.py
+# Mean and sum of regions of interest on every frame, computed in the camera process.
+#
+# cam_dict:
+#   "rois": [{"name": "lick", "rect": [x, y, width, height], "threshold": 120},
+#            {"name": "cell", "mask": "masks/cell.npy"}],
+#   "roi_udp": "192.168.1.10:9998"
+#
+# While saving, the traces go to <run>_<camera>_rois.tsv with the frame ids and
+# timestamps. With roi_udp, a packet 'roi=NAME;frame=ID;value=V;state=1|0' is sent
+# when the mean (or 'stat': 'sum') of a ROI crosses its threshold. Names are ascii
+# without ';' or '=', failed sends are counted, they never stop the camera.
+import os
+import re
+import time
+from os.path import dirname
+
+import numpy as np
+
+from neucams.udp_socket import UDPSocket
+from neucams.utils import display, sidecar_path
+
+LATENCY_TARGET = 2e-3  # s from frame arrival to packet, slower runs are reported as warnings
+_NAME = re.compile(r'[\x21-\x7e]+')  # printable ascii, no spaces
+
+
+class ROI:
+    """Rectangle (slices) or mask (precomputed flat indices) of a frame"""
+    def __init__(self, spec):
+        self.name = str(spec['name'])
+        if not _NAME.fullmatch(self.name) or ';' in self.name or '=' in self.name:
+            raise ValueError(f"ROI name {self.name!r} should be ascii, without spaces, ';' or '='")
+        self.stat = spec.get('stat', 'mean')
+        self.threshold = spec.get('threshold', None)
+        self.hysteresis = float(spec.get('hysteresis', 0.))
+        self.above = False
+        self._slices = None
+        self._index = None
+        self._mask_shape = None
+        if 'rect' in spec:
+            x, y, width, height = [int(v) for v in spec['rect']]
+            self._slices = (slice(y, y + height), slice(x, x + width))
+            self.n_pixels = width * height
+        elif 'mask' in spec:
+            mask = np.load(spec['mask']) if isinstance(spec['mask'], str) else np.asarray(spec['mask'])
+            mask = mask.astype(bool)
+            self._mask_shape = mask.shape[:2]
+            self._index = np.flatnonzero(mask[:, :, 0] if mask.ndim == 3 else mask)
+            self.n_pixels = len(self._index)
+        else:
+            raise ValueError(f"ROI {self.name} needs a 'rect' [x, y, width, height] or a 'mask'")
+        if not self.n_pixels:
+            raise ValueError(f"ROI {self.name} is empty")
+
+    def reduce(self, frame):
+        """(sum, mean) over the ROI and the channels, nan when the frame does not fit"""
+        if self._slices is not None:
+            pixels = frame[self._slices]
+            if pixels.shape[0] * pixels.shape[1] != self.n_pixels:
+                return np.nan, np.nan  # outside of the frame (roi / binning changed)
+        else:
+            if frame.shape[:2] != self._mask_shape:
+                return np.nan, np.nan
+            pixels = np.take(frame.reshape(frame.shape[0] * frame.shape[1], -1), self._index, axis=0)
+        total = float(pixels.sum())  # integer frames accumulate exactly in (u)int64
+        return total, total / pixels.size
+
+    def crossed(self, value):
+        """New state when value crosses the threshold, None otherwise"""
+        if self.threshold is None or value != value:  # nan
+            return None
+        if not self.above and value > self.threshold + self.hysteresis:
+            self.above = True
+            return True
+        if self.above and value < self.threshold - self.hysteresis:
+            self.above = False
+            return False
+        return None
+
+
+class ROITraces:
+    """The ROIs of a camera, traces written to a sidecar file and threshold packets"""
+    def __init__(self, cam_dict):
+        self.cam_name = cam_dict.get('description', '')
+        self.rois = []
+        for spec in cam_dict.get('rois', []) or []:
+            try:
+                self.rois.append(ROI(spec))
+            except Exception as e:
+                display(f"[{self.cam_name}] could not load ROI {spec}: {e}", level='error')
+        self.udp_address = None
+        self.socket = None
+        address = cam_dict.get('roi_udp', None)
+        if address and self.rois:
+            if isinstance(address, str):
+                host, _, port = address.rpartition(':')
+                address = (host, int(port))
+            self.udp_address = tuple(address)
+            self.socket = UDPSocket(('0.0.0.0', 0))  # any local port, only sends
+        self._file = None
+        self.reset_stats()
+
+    def __bool__(self):
+        return bool(self.rois)
+
+    def reset_stats(self):
+        self.n_packets = 0
+        self.n_send_errors = 0
+        self.latency_max = 0.
+
+    def process(self, frame, metadata, filepath=None, t_arrival=None):
+        """Traces of one frame; filepath (the run) is given while saving.
+        t_arrival: perf_counter() when image() returned the frame, packet latencies
+        are measured from there (from this call when None)."""
+        t = time.perf_counter() if t_arrival is None else t_arrival
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        values = [roi.reduce(frame) for roi in self.rois]
+        if self.socket is not None:
+            for roi, (total, mean) in zip(self.rois, values):
+                state = roi.crossed(total if roi.stat == 'sum' else mean)
+                if state is not None:
+                    value = total if roi.stat == 'sum' else mean
+                    try:
+                        self.socket.send(f"roi={roi.name};frame={metadata[0]};value={value:.3f};"
+                                         f"state={int(state)}", self.udp_address)
+                    except OSError as e:  # unreachable network, full buffer...
+                        self.n_send_errors += 1
+                        if self.n_send_errors == 1:
+                            display(f"[{self.cam_name}] could not send the ROI packet to "
+                                    f"{self.udp_address}: {e}", level='error')
+                        continue
+                    self.n_packets += 1
+                    self.latency_max = max(self.latency_max, time.perf_counter() - t)
+        if filepath is not None:
+            self._write(filepath, metadata, values)
+
+    def _write(self, filepath, metadata, values):
+        if self._file is None:
+            path = sidecar_path(filepath, self.cam_name, 'rois')
+            os.makedirs(dirname(path), exist_ok=True)
+            self._file = open(path, 'a', buffering=1 << 16)
+            if self._file.tell() == 0:
+                columns = ['frame_id', 'timestamp']
+                for roi in self.rois:
+                    columns += [f'{roi.name}_mean', f'{roi.name}_sum']
+                self._file.write('\t'.join(columns) + '\n')
+        line = [str(metadata[0]), f"{metadata[1]:.6f}"]
+        for total, mean in values:
+            line += [f"{mean:.4f}", f"{total:.0f}" if total == total else 'nan']
+        self._file.write('\t'.join(line) + '\n')
+
+    def close_run(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.n_packets:
+            display(f"[{self.cam_name}] {self.n_packets} ROI threshold packets, "
+                    f"max {self.latency_max * 1e3:.2f} ms from frame arrival to packet",
+                    level='warning' if self.latency_max > LATENCY_TARGET else 'info')
+        if self.n_send_errors:
+            display(f"[{self.cam_name}] {self.n_send_errors} ROI threshold packets could not be sent",
+                    level='warning')
+        for roi in self.rois:
+            roi.above = False
+        self.reset_stats()
+
+    def close(self):
+        self.close_run()
+        if self.socket is not None:
+            self.socket.socket.close()
+            self.socket = None
@@ -0,0 +1,114 @@
+# neucams/session.py
+# Acquisition from Python code (closed loop experiments), no GUI and no files needed.
+#
+#   from neucams.session import Session
+#   with Session('config.json') as session:
+#       session.start()
+#       for frame in session.stream('eye'):
+#           process(frame.array, frame.frame_id)   # read-only view, valid until released
+from neucams.camera_handler import CameraFactory, init_cam_handlers
+from neucams.frame_ring import CameraStream, StreamFrame
+from neucams.tracking import init_tracker
+from neucams.utils import display, get_preferences, check_preferences
+
+
+class Session:
+    """Cameras of a preferences file (or dict) running in their handler processes,
+    controlled from Python. Every camera gets a stream ring of stream_slots frames.
+
+    with Session('config.json') as session:
+        session.start(record=True)
+        ...
+        session.stop()
+    """
+    def __init__(self, prefs, stream_slots=32):
+        if isinstance(prefs, str):
+            ret, prefs = get_preferences(prefs, create_template=False)
+            if ret is not True:
+                raise ValueError(ret if isinstance(ret, str) else "Could not load the preferences")
+        error_message = check_preferences(prefs, valid_drivers=list(CameraFactory.cameras.keys()))
+        if error_message:
+            raise ValueError(error_message)
+        self.prefs = prefs
+        self.stream_slots = stream_slots
+        self.cam_handlers = {}
+        self._rings = {}
+        self._streams = {}
+        self.trackers = {}
+
+    def open(self, timeout=10.):
+        valid_drivers = list(CameraFactory.cameras.keys())
+        cams = [cam for cam in self.prefs.get('cams', []) if cam.get('driver', '').lower() in valid_drivers]
+        for cam, cam_handler in init_cam_handlers(cams, self.prefs):
+            name = cam.get('description')
+            if self.stream_slots:
+                self._rings[name] = cam_handler.enable_stream(self.stream_slots)
+            tracker = init_tracker(cam_handler)
+            cam_handler.start()
+            self.cam_handlers[name] = cam_handler
+            if tracker is not None:
+                tracker.start()
+                self.trackers[name] = tracker
+        for name, cam_handler in self.cam_handlers.items():
+            if not cam_handler.camera_ready.wait(timeout):
+                display(f"Camera {name} not ready after {timeout} s", level='warning')
+        return self
+
+    @property
+    def cameras(self):
+        return list(self.cam_handlers)
+
+    def stream(self, camera=None, max_lag=None, auto_release=True, timeout=None):
+        """CameraStream of a camera (the first one if None).
+        One stream per camera, a previous stream of the camera is closed."""
+        camera = self.cameras[0] if camera is None else camera
+        if camera not in self._rings:
+            raise KeyError(f"No stream for camera {camera} (cameras: {', '.join(self.cameras)})")
+        if camera in self._streams:
+            self._streams[camera].close()
+        ring, channel = self._rings[camera]
+        stream = CameraStream(ring, channel, self.cam_handlers[camera].handler_closed, max_lag=max_lag,
+                              auto_release=auto_release, timeout=timeout)
+        self._streams[camera] = stream
+        return stream
+
+    def start(self, record=False, cameras=None, timeout=5.):
+        for name in cameras or self.cameras:
+            cam_handler = self.cam_handlers[name]
+            if not cam_handler.camera_ready.wait(timeout):
+                display(f"Camera {name} not ready", level='warning')
+                continue
+            if record:
+                cam_handler.start_saving()
+            else:
+                cam_handler.stop_saving()
+            cam_handler.start_acquisition()
+
+    def stop(self, cameras=None, wait=True, timeout=5.):
+        for name in cameras or self.cameras:
+            self.cam_handlers[name].stop_acquisition()
+        if wait:
+            for name in cameras or self.cameras:
+                self.cam_handlers[name].is_acquisition_done.wait(timeout)
+
+    def set_folder_path(self, folder_path):
+        for cam_handler in self.cam_handlers.values():
+            cam_handler.set_folder_path(folder_path)
+
+    def close(self):
+        for stream in self._streams.values():
+            stream.close()
+        for cam_handler in self.cam_handlers.values():
+            cam_handler.close()
+            cam_handler.join(5)
+        for tracker in self.trackers.values():
+            tracker.close()
+        for ring, _ in self._rings.values():
+            ring.close()
+        self._streams, self._rings, self.cam_handlers, self.trackers = {}, {}, {}, {}
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
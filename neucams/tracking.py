@@ -0,0 +1,195 @@
+# neucams/tracking.py
+# Online pupil tracking, one worker process per camera fed by a stream ring of the handler.
+#
+# cam_dict:
+#   "pupil_tracking": {"roi": [x, y, width, height], "threshold": 40, "blur": 5,
+#                      "min_area": 20, "max_lag": 4, "bit_depth": 12}
+#
+# The pupil is the largest dark blob in the roi: threshold (Otsu when threshold is
+# None), opening, external contours, ellipse fit. The threshold is on an 8 bit scale:
+# deeper frames are scaled by their bit_depth (the full range of the dtype by
+# default, 0-1 for floats), the same for every frame. While saving, every tracked
+# frame is a row of <run>_<camera>_pupil.tsv with its frame id; the last fit is
+# shared with the viewer for the overlay. The tracker skips frames (max_lag)
+# rather than slowing down the camera.
+import os
+import time
+from multiprocessing import Process, Event, Array, Value
+from os.path import dirname
+
+import cv2
+import numpy as np
+
+from neucams.frame_ring import CameraStream, FrameRing
+from neucams.utils import display, sidecar_path
+
+PUPIL_COLUMNS = ('frame_id', 'timestamp', 'x', 'y', 'width', 'height', 'angle', 'area')
+
+
+def fit_pupil(img, roi=None, threshold=None, blur=5, min_area=20, open_size=3, bit_depth=None):
+    """Ellipse of the largest dark blob of img (H x W [x n_chan]).
+    threshold is 0-255, frames other than uint8 are scaled from bit_depth bits.
+    Returns (x, y, width, height, angle, area) in frame pixels (cv2.fitEllipse
+    convention, angle in degrees), None when nothing is found."""
+    x0 = y0 = 0
+    if roi is not None:
+        x0, y0, width, height = [int(v) for v in roi]
+        img = img[y0:y0 + height, x0:x0 + width]
+    if img.ndim == 3:
+        img = img[:, :, 0] if img.shape[2] == 1 else cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2GRAY)
+    if img.dtype != np.uint8:
+        # fixed scale, a min-max stretch would move the threshold with every frame
+        if np.issubdtype(img.dtype, np.integer):
+            vmax = (1 << int(bit_depth)) - 1 if bit_depth else np.iinfo(img.dtype).max
+        else:
+            vmax = 1.
+        img = cv2.convertScaleAbs(img, alpha=255. / vmax)
+    else:
+        img = np.ascontiguousarray(img)
+    if blur:
+        ksize = int(blur) | 1  # odd
+        img = cv2.GaussianBlur(img, (ksize, ksize), 0)
+    if threshold is None:
+        _, mask = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    else:
+        _, mask = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY_INV)
+    if open_size:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (int(open_size), int(open_size)))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]  # opencv 3 and 4
+    best, best_area = None, float(min_area)
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area >= best_area and len(contour) >= 5:
+            best, best_area = contour, area
+    if best is None:
+        return None
+    (x, y), (width, height), angle = cv2.fitEllipse(best)
+    return x + x0, y + y0, width, height, angle, best_area
+
+
+def ellipse_points(x, y, width, height, angle, n=48):
+    """n x 2 points (x, y) of the outline of an ellipse given as by fit_pupil"""
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    a = np.deg2rad(angle)
+    px, py = width / 2 * np.cos(t), height / 2 * np.sin(t)
+    return np.column_stack([x + px * np.cos(a) - py * np.sin(a),
+                            y + px * np.sin(a) + py * np.cos(a)])
+
+
+class PupilTracker(Process):
+    """Tracking worker of one camera (see the module header for the parameters).
+
+    Created in the parent before cam_handler.start(): it adds a stream ring to the
+    handler, the ring is closed by close(). last_fit() gives the newest result.
+    """
+    def __init__(self, cam_handler, params=None, n_slots=8):
+        super().__init__(daemon=True)
+        params = dict(params or {})
+        self.cam_name = cam_handler.cam_dict.get('description', '')
+        self.max_lag = params.pop('max_lag', 4)
+        self.fit_params = params
+        self.ring, self.channel = cam_handler.enable_stream(n_slots)
+        # what the handler shares, to follow its runs
+        self.handler_closed = cam_handler.handler_closed
+        self.saving = cam_handler.saving
+        self.filepath_array = cam_handler.filepath_array
+        self.close_event = Event()
+        # count, then one value per PUPIL_COLUMNS (nan when the fit failed)
+        self.fit = Array('d', 1 + len(PUPIL_COLUMNS))
+        self.n_tracked = Value('q', 0, lock=False)
+        self.n_failed = Value('q', 0, lock=False)
+        self._file = None
+        self._path = None
+
+    def run(self):
+        ring = FrameRing.from_ref(self.channel.ref)
+        stream = CameraStream(ring, self.channel, self.handler_closed, max_lag=self.max_lag)
+        t_fit = 0.
+        try:
+            while not self.close_event.is_set():
+                frame = stream.read(timeout=0.5)
+                if frame is None:
+                    if self.handler_closed.is_set():
+                        break
+                    self._close_file()  # idle, the run is probably over
+                    continue
+                t = time.perf_counter()
+                try:
+                    fit = fit_pupil(frame.array, **self.fit_params)
+                except cv2.error as e:
+                    if not self.n_failed.value:
+                        display(f"[{self.cam_name}] pupil tracking failed: {e}", level='error')
+                    fit = None
+                t_fit += time.perf_counter() - t
+                frame_id, timestamp = frame.frame_id, frame.timestamp
+                frame.release()
+                row = (frame_id, timestamp) + (fit if fit is not None else (np.nan,) * 6)
+                self._share(row)
+                if self.saving.is_set():
+                    self._write(row)
+                if fit is None:
+                    self.n_failed.value += 1
+                self.n_tracked.value += 1
+        finally:
+            stream.close()
+            self._close_file()
+            ring.close()
+            if self.n_tracked.value:
+                display(f"[{self.cam_name}] pupil tracking: {self.n_tracked.value} frames, "
+                        f"{t_fit / self.n_tracked.value * 1e3:.2f} ms per fit, {self.n_failed.value} without pupil, "
+                        f"{stream.skipped} skipped, {self.channel.dropped.value} dropped")
+
+    def _share(self, row):
+        with self.fit.get_lock():
+            self.fit[1:] = list(row)
+            self.fit[0] += 1
+
+    def _write(self, row):
+        path = sidecar_path(str(self.filepath_array[:]).strip(' '), self.cam_name, 'pupil')
+        if path != self._path:
+            self._close_file()
+            os.makedirs(dirname(path), exist_ok=True)
+            self._file = open(path, 'a', buffering=1 << 16)
+            self._path = path
+            if self._file.tell() == 0:
+                self._file.write('\t'.join(PUPIL_COLUMNS) + '\n')
+        self._file.write(f"{row[0]}\t{row[1]:.6f}\t" + '\t'.join(f"{v:.3f}" for v in row[2:]) + '\n')
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._path = None
+
+    # ------------------------------------------------------------------
+    def last_fit(self):
+        """(frame_id, x, y, width, height, angle) of the newest frame with a pupil, None otherwise"""
+        with self.fit.get_lock():
+            count, frame_id, _, x, y, width, height, angle, _ = self.fit[:]
+        if not count or x != x:  # nothing yet, or no pupil in the last frame
+            return None
+        return int(frame_id), x, y, width, height, angle
+
+    def close(self, timeout=2.):
+        """Stops the worker (it also stops with the handler) and frees the ring"""
+        self.close_event.set()
+        if self.pid is not None:
+            self.join(timeout)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def init_tracker(cam_handler):
+    """PupilTracker of a camera with 'pupil_tracking' in its cam_dict, None otherwise.
+    Call before cam_handler.start(), start the tracker with the handler."""
+    params = cam_handler.cam_dict.get('pupil_tracking', None)
+    if params is None or params is False:
+        return None
+    try:
+        return PupilTracker(cam_handler, params if isinstance(params, dict) else {})
+    except Exception as e:
+        display(f"[{cam_handler.cam_dict.get('description', '')}] could not start pupil tracking: {e}",
+                level='error')
+        return None
@@ -1,7 +1,12 @@
 import sys
+import os
 from os import path, makedirs
 from datetime import datetime
 import json
+import re
+from contextlib import contextmanager
+import hashlib
+import numpy as np
 import time
 import platform
 import subprocess
@@ -67,6 +72,91 @@ DEFAULT_CAM_INFOS = [
 def get_default_folder():
     return path.join(path.expanduser('~'), 'labcams')
 
+def sidecar_path(run_filepath, cam_name, kind):
+    """<run>_<camera>_<kind>.tsv next to the recording: the cameras can share a folder
+    and run numbers, the camera description keeps their tables apart"""
+    cam_name = re.sub(r'[^\w.-]+', '_', str(cam_name)).strip('_')
+    return f"{run_filepath}_{cam_name}_{kind}.tsv" if cam_name else f"{run_filepath}_{kind}.tsv"
+
+def get_user_config_dir():
+    if platform.system() == "Windows":
+        base = os.getenv('LOCALAPPDATA', os.path.expanduser('~'))
+        return os.path.join(base, "NeuCams")
+    else:
+        base = os.getenv('XDG_CONFIG_HOME', os.path.expanduser('~/.config'))
+        return os.path.join(base, "NeuCams")
+
+def _format_cache_path():
+    return path.join(get_user_config_dir(), 'format_cache.json')
+
+def format_cache_key(cam_dict):
+    """Driver, camera and a hash of the params: the frame format only depends on those"""
+    params = json.dumps(cam_dict.get('params', {}), sort_keys=True, default=str)
+    device = cam_dict.get('serial_number', cam_dict.get('id', ''))
+    return f"{cam_dict.get('driver', '').lower()}:{device}:{hashlib.sha1(params.encode()).hexdigest()[:12]}"
+
+def _read_format_cache():
+    try:
+        with open(_format_cache_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+@contextmanager
+def _cache_lock(timeout=5., stale=30.):
+    """Lock file shared by the threads and handler processes writing the format cache"""
+    lock_path = _format_cache_path() + '.lock'
+    tstart = time.monotonic()
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.getmtime(lock_path) > stale:
+                    os.remove(lock_path)  # left by a process that died
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() - tstart > timeout:
+                raise TimeoutError(f"format cache locked ({lock_path})")
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def get_cached_format(key):
+    """Format stored by cache_format for key, None if unknown"""
+    fmt = _read_format_cache().get(key, None)
+    if fmt is not None:
+        fmt['dtype'] = np.dtype(fmt['dtype'])
+    return fmt
+
+def cache_format(key, fmt):
+    keys = ('dtype', 'height', 'width', 'n_chan', 'max_height', 'max_width')
+    entry = {k: fmt[k] for k in keys if fmt.get(k, None) is not None}
+    entry['dtype'] = str(np.dtype(entry['dtype'])) if 'dtype' in entry else 'uint8'
+    entry = {k: (int(v) if k != 'dtype' else v) for k, v in entry.items()}
+    cache_path = _format_cache_path()
+    try:
+        makedirs(get_user_config_dir(), exist_ok=True)
+        # cameras initialise in parallel: re-read and merge under the lock, then
+        # replace the file in one step so readers never see a partial write
+        with _cache_lock():
+            cache = _read_format_cache()
+            cache[key] = entry
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f, indent=1)
+            os.replace(tmp_path, cache_path)
+    except (OSError, TimeoutError) as e:
+        display(f"Could not write the format cache: {e}", level='warning')
+
 def get_default_preferences():
     return {'cams': DEFAULT_CAM_INFOS, 'recorder_params': DEFAULT_RECORDER_PARAMS, 'server_params' : DEFAULT_SERVER_PARAMS}
     
@@ -152,36 +242,14 @@ def resolve_cam_id_by_serial(driver, serial_number):
     elif driver == 'pco':
         # PCO cameras are often opened by index, not ID.
         return None
-    elif driver == 'avt':
-        try:
-            from vmbpy import VmbSystem
-            with VmbSystem.get_instance() as vmb:
-                for cam in vmb.get_all_cameras():
-                    if hasattr(cam, 'get_serial') and cam.get_serial() == serial_number:
-                        return cam.get_id()
-            display(f"No AVT camera found with serial number {serial_number}", level='warning')
-            return None # Not found
-        except ImportError:
-            display("vmbpy not found, cannot resolve AVT camera by serial.", level='error')
-            return None
-        except Exception as e:
-            display(f"An error occurred while resolving AVT cam by serial: {e}", level='error')
-            return None
-    elif driver == "hamamatsu":
-        try:
-            # new API shipped with the `hamamatsu` / `pyDCAM` wheels
-            # (they just ctypes-load dcamapi.dll, so the DLL-in-PATH trick you did still works)
-            from hamamatsu.dcam import dcam           # or: from pydcam import dcam
-
-            with dcam:                                # opens the DCAM runtime
-                for idx, cam in enumerate(dcam):      # camera objects are iterable
-                    if cam.info.get("serial_number") == serial_number:  # <-- replacement!
-                        return idx                    # DCAM uses the index as camera-ID
-        except Exception as exc:
-            display(f"Hamamatsu lookup failed: {exc}", level="warning")
-
-        return None
-    else:
+    from neucams.cams import registry
+    if driver not in registry.ENUMERATORS:
         display(f"Serial number resolution not implemented for driver: {driver}", level='warning')
         return None
+    # enumerated once per process, see neucams.cams.registry
+    dev = registry.find_device(driver, serial_number)
+    if dev is None:
+        display(f"No {driver} camera found with serial number {serial_number}", level='warning')
+        return None
+    return dev.index if driver == 'hamamatsu' else dev.id  # DCAM uses the index as camera-ID
     
\ No newline at end of file
@@ -1,5 +1,5 @@
 from PyQt5.QtWidgets import QWidget
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import Qt
 import time
 import numpy as np
 
@@ -15,8 +15,8 @@ def nparray_to_qimg(img):
     
     dtype = img.dtype
     if dtype == np.uint16:
-        import cv2
-        img = cv2.convertScaleAbs(img)
+        # the display pipeline already maps to 8 bit, keep the high byte otherwise
+        img = (img >> 8).astype(np.uint8)
         
     from PyQt5.QtGui import QImage
     format = QImage.Format_Grayscale8 if n_chan == 1 else QImage.Format_RGB888
@@ -32,10 +32,7 @@ class BaseCameraWidget(QWidget):
         super().__init__()
         self.cam_handler = cam_handler
 
-        # --- Timer for UI updates ---
-        self._timer = QTimer(self)
-        self._timer.timeout.connect(self._update)
-        self._timer.start(100)
+        # _update (new frame) and _update_status are called by the window's DisplayScheduler
 
         # --- FPS computation ---
         self._prev_time = time.time()
@@ -47,22 +44,18 @@ class BaseCameraWidget(QWidget):
         # --- Image buffers ---
         self.original_img = None
         self.processed_img = None
-        self.is_img_processed = False
         self.frame_nr = None
 
     def _update(self):
         raise NotImplementedError("Subclasses must implement the update method.")
 
+    def _update_status(self):
+        pass
+
     def _pixmap_aspect_ratio(self, state):
         self.AR_policy = Qt.KeepAspectRatio if state else Qt.IgnoreAspectRatio
-
-    def resizeEvent(self, event):
-        pixmap = self.img_label.pixmap()
-        if pixmap and not pixmap.isNull():
-            self.img_label.setMinimumSize(1,1)
-            pixmap = pixmap.scaled(self.img_label.width(), self.img_label.height(),
-                                   self.AR_policy, Qt.FastTransformation)
-            self.img_label.setPixmap(pixmap)
+        self.img_view.keep_aspect_ratio = bool(state)
+        self.img_view.update()
 
     def start_cam(self):
         if self.cam_handler:
@@ -3,11 +3,12 @@ from os.path import dirname, join
 import numpy as np
 from PyQt5 import uic
 from PyQt5.QtWidgets import QWidget
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 
 from .image_processing import (HistogramStretcher, ImageFlipper,
                                ImageProcessingPipeline, ImageRotator,
-                               GaussianBlur, BackgroundSubtractor)
+                               GaussianBlur, BackgroundSubtractor, DisplayMapper,
+                               FastHistogram)
 
 @lru_cache(maxsize=1)
 def get_image_depth(dtype):
@@ -24,7 +25,12 @@ def get_image_depth(dtype):
 class DisplaySettingsWidget(QWidget):
     """Upgraded widget to handle advanced display settings including rotation,
     flipping, and histogram stretching via a processing pipeline.
+
+    process_img runs on the camera's processing thread, it does not touch Qt
+    widgets; the histogram plot is updated by update_histogram_plot.
     """
+    changed = pyqtSignal()  # settings changed, the last frame should be processed again
+
     def __init__(self, parent):
         super().__init__(parent)
 
@@ -36,11 +42,15 @@ class DisplaySettingsWidget(QWidget):
         self.stretcher = HistogramStretcher()
         self.flipper = ImageFlipper()
         self.rotator = ImageRotator()
-        self.pipeline.add_stage(self.stretcher)
-        self.pipeline.add_stage(self.flipper)
-        self.pipeline.add_stage(self.rotator)
+        # stretch, flip, rotate and 8 bit conversion fused in one stage
+        self.pipeline.add_stage(DisplayMapper(self.stretcher, self.flipper, self.rotator))
         
         self.last_img = None
+        self.histogram = FastHistogram()
+        self.auto_stretch_percentiles = (0.5, 99.5)
+        self._hist_curve = None
+        self._hist_updated = False
+        self._shown = False
 
         # Connect UI controls to methods
         self.graphWidget.showAxis('left', False)
@@ -58,23 +68,37 @@ class DisplaySettingsWidget(QWidget):
             self.keep_AR_checkBox.stateChanged.connect(parent._pixmap_aspect_ratio)
 
 
+    def showEvent(self, event):
+        self._shown = True
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._shown = False
+        super().hideEvent(event)
+
     def set_minimum(self, val):
         self.stretcher.set_range(val, self.stretcher.max_percent)
+        self.changed.emit()
 
     def set_maximum(self, val):
         self.stretcher.set_range(self.stretcher.min_percent, val)
+        self.changed.emit()
 
     def toggle_flip_h(self, checked):
         self.flipper.flip_h = checked
+        self.changed.emit()
 
     def toggle_flip_v(self, checked):
         self.flipper.flip_v = checked
+        self.changed.emit()
 
     def rotate_cw(self):
         self.rotator.set_angle(self.rotator.angle + 90)
+        self.changed.emit()
 
     def rotate_ccw(self):
         self.rotator.set_angle(self.rotator.angle - 90)
+        self.changed.emit()
 
     def reset(self):
         """Resets all display settings to their default values."""
@@ -88,15 +112,18 @@ class DisplaySettingsWidget(QWidget):
         self.flipper.flip_v = False
 
         self.rotator.set_angle(0)
+        self.changed.emit()
 
     def auto_stretch(self):
-        """Automatically sets the contrast to the min/max of the image."""
+        """Sets the contrast to the percentiles of the image histogram
+        (robust to a few hot or dead pixels)."""
         if self.last_img is None:
             return
 
-        min_val = np.min(self.last_img)
-        max_val = np.max(self.last_img)
         img_depth = get_image_depth(self.last_img.dtype)
+        self.histogram.update(self.last_img, img_depth, force=True)
+        min_val = self.histogram.percentile(self.auto_stretch_percentiles[0])
+        max_val = self.histogram.percentile(self.auto_stretch_percentiles[1])
 
         # Convert to percentage for the sliders
         min_percent = int((min_val / img_depth) * 100)
@@ -105,20 +132,29 @@ class DisplaySettingsWidget(QWidget):
         self.min_horizontalSlider.setValue(min_percent)
         self.max_horizontalSlider.setValue(max_percent)
         self.stretcher.set_range(min_percent, max_percent)
+        self.changed.emit()
 
     def process_img(self, img):
-        if self.isVisible():
+        self.stretcher.set_depth(get_image_depth(img.dtype))
+        if self._shown:
             self.last_img = img  # Keep a reference for auto-stretch
             self.process_histogram(img)
-            self.stretcher.set_depth(get_image_depth(img.dtype))
 
         return self.pipeline.apply(img)
 
     def process_histogram(self, img):
-        self.graphWidget.clear()
-        img_depth = get_image_depth(img.dtype)
-        y, x = np.histogram(img, bins=100, range=(0, img_depth))
-        self.graphWidget.plot(y)
+        # throttled, the plot is updated from the GUI thread
+        if self.histogram.update(img, get_image_depth(img.dtype)):
+            self._hist_updated = True
+
+    def update_histogram_plot(self):
+        if not self._hist_updated:
+            return
+        self._hist_updated = False
+        if self._hist_curve is None:
+            self._hist_curve = self.graphWidget.plot(self.histogram.counts)
+        else:
+            self._hist_curve.setData(self.histogram.counts)
 
 
 class ImageProcessingWidget(QWidget):
@@ -138,6 +174,7 @@ class ImageProcessingWidget(QWidget):
 
         self.groupBox_2.toggled.connect(self.toggle_bg_subtract)
         self.n_frames_spinBox.valueChanged.connect(self.set_n_frames)
+        self.bg_mode_comboBox.currentIndexChanged.connect(self.set_bg_mode)
 
     def toggle_blur(self, enabled):
         self.blur_stage.enabled = enabled
@@ -158,6 +195,9 @@ class ImageProcessingWidget(QWidget):
     def set_n_frames(self, value):
         self.bg_subtract_stage.set_n_frames(value)
 
+    def set_bg_mode(self, index):
+        self.bg_subtract_stage.set_mode(BackgroundSubtractor.MODES[index])
+
     def add_to_pipeline(self, pipeline: ImageProcessingPipeline):
         """Adds the processing stages from this widget to a pipeline."""
         pipeline.add_stage(self.blur_stage)
@@ -1,3 +1,4 @@
+import time
 import cv2
 import numpy as np
 
@@ -23,6 +24,46 @@ class ImageProcessingPipeline:
             self.stages[index] = new_stage
 
 
+class FastHistogram:
+    """Histogram of integer images for the display: a strided subsample of about
+    max_pixels pixels, binned with np.bincount on values shifted down to n_bins bins.
+    update() recomputes at most max_rate times per second."""
+    def __init__(self, n_bins=128, max_pixels=65_536, max_rate=4.):
+        self.n_bins = n_bins
+        self.max_pixels = max_pixels
+        self.max_rate = max_rate
+        self.counts = None
+        self.depth = 255
+        self._shift = 0
+        self._last = 0.
+
+    def update(self, img, depth, force=False):
+        """Returns True when the histogram was recomputed"""
+        now = time.perf_counter()
+        if not force and self.max_rate > 0 and now - self._last < 1. / self.max_rate:
+            return False
+        self._last = now
+        step = max(1, int(np.sqrt(img.shape[0] * img.shape[1] / self.max_pixels)))
+        sample = img[::step, ::step]
+        # bins are powers of 2 wide so a shift gives the bin index
+        self.depth = depth
+        self._shift = max(0, int(depth).bit_length() - (self.n_bins - 1).bit_length())
+        if sample.dtype.kind in 'ui':
+            values = sample.ravel() >> self._shift
+        else:
+            values = (np.clip(sample, 0, depth).ravel()).astype(np.int64) >> self._shift
+        self.counts = np.bincount(values, minlength=self.n_bins)[:self.n_bins]
+        return True
+
+    def percentile(self, q):
+        """Value below which q percent of the (sampled) pixels are"""
+        if self.counts is None:
+            return None
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, cumulative[-1] * q / 100.))
+        return min((index << self._shift) + ((1 << self._shift) >> 1), self.depth)  # bin center
+
+
 class ProcessingStage:
     """Base class for a processing stage."""
     def apply(self, img: np.ndarray) -> np.ndarray:
@@ -65,39 +106,99 @@ class HistogramStretcher(ProcessingStage):
         stretched = np.clip(stretched, 0, self.img_depth)
         return stretched.astype(img.dtype)
 
+    def lut(self, dtype):
+        """uint8 lookup table mapping every value of dtype (uint8/uint16) through the
+        contrast window to 0-255. Rebuilt only when the window or the depth change."""
+        key = (np.dtype(dtype), self.min_percent, self.max_percent, self.img_depth)
+        if getattr(self, '_lut_key', None) != key:
+            min_val = self.min_percent / 100 * self.img_depth
+            max_val = max(self.max_percent / 100 * self.img_depth, min_val + 1)
+            values = np.arange(np.iinfo(dtype).max + 1, dtype=np.float32)
+            lut = (values - min_val) * (255. / (max_val - min_val))
+            self._lut = np.clip(lut, 0, 255).astype(np.uint8)
+            self._lut_key = key
+        return self._lut
+
 
 class BackgroundSubtractor(ProcessingStage):
-    """Subtracts the average of the last N frames (background) from the current image."""
-    def __init__(self, n_frames=10):
+    """Subtracts a background from the current image: the mean of the last N frames
+    ('window') or an exponential moving average with a span of N frames ('ema').
+
+    The window is a preallocated ring of N frames with a running sum, each frame
+    costs O(pixels) whatever N. Runs on the (decimated) preview the widget gets,
+    the buffers are reset when the frame size changes.
+    """
+    MODES = ('window', 'ema')
+
+    def __init__(self, n_frames=10, mode='window'):
         self.n_frames = n_frames
+        self.mode = mode
         self.enabled = False
-        self.buffer = []
-        self.background = None
+        self._reset()
 
     def set_n_frames(self, n):
         self.n_frames = max(1, int(n))
-        self.buffer = []  # Reset buffer when N changes
-        self.background = None
+        self.reset()  # Reset buffer when N changes
+
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown background mode {mode} ({'|'.join(self.MODES)})")
+        self.mode = mode
+        self.reset()
 
     def reset(self):
-        self.buffer = []
-        self.background = None
+        # done by apply(), settings change from the GUI thread while a worker processes
+        self._reset_pending = True
+
+    def _reset(self):
+        self._ring = None   # (N, H, W, C) float32, window mode
+        self._sum = None    # running sum (window) or the average (ema)
+        self._tmp = None
+        self._pos = 0
+        self._count = 0
+        self._reset_pending = False
+
+    @property
+    def background(self):
+        if self._reset_pending or self._sum is None or self._count == 0:
+            return None
+        return self._sum / self._count if self.mode == 'window' else self._sum.astype(np.float32)
+
+    def _allocate(self, shape):
+        self._reset()
+        if self.mode == 'window':
+            self._ring = np.zeros((self.n_frames,) + shape, dtype=np.float32)
+        self._sum = np.zeros(shape, dtype=np.float64)  # float64, no drift of the running sum
+        self._tmp = np.empty(shape, dtype=np.float32)
 
     def apply(self, img: np.ndarray) -> np.ndarray:
         if not self.enabled:
             return img
-        # Add current frame to buffer
-        self.buffer.append(img.astype(np.float32))
-        if len(self.buffer) > self.n_frames:
-            self.buffer.pop(0)
-        # Compute background if enough frames
-        if len(self.buffer) == self.n_frames:
-            self.background = np.mean(self.buffer, axis=0)
-            result = cv2.subtract(img.astype(np.float32), self.background)
-            result = np.clip(result, 0, np.iinfo(img.dtype).max)
-            return result.astype(img.dtype)
+        if self._reset_pending or self._sum is None or self._sum.shape != img.shape:
+            self._allocate(img.shape)
+        frame = self._tmp
+        frame[:] = img
+        if self.mode == 'ema':
+            if self._count == 0:
+                self._sum[:] = frame
+            else:
+                alpha = 2. / (self.n_frames + 1)
+                self._sum *= 1. - alpha
+                self._sum += alpha * frame
+            self._count = 1
+            np.subtract(frame, self._sum, out=frame, casting='unsafe')
         else:
-            return img
+            self._sum -= self._ring[self._pos]
+            self._sum += frame
+            self._ring[self._pos] = frame
+            self._pos = (self._pos + 1) % self.n_frames
+            self._count = min(self._count + 1, self.n_frames)
+            # Compute background if enough frames
+            if self._count < self.n_frames:
+                return img
+            np.subtract(frame, self._sum * (1. / self.n_frames), out=frame, casting='unsafe')
+        np.clip(frame, 0, np.iinfo(img.dtype).max, out=frame)
+        return frame.astype(img.dtype)
 
 
 class GaussianBlur(ProcessingStage):
@@ -130,6 +231,34 @@ class ImageFlipper(ProcessingStage):
         return img
 
 
+class DisplayMapper(ProcessingStage):
+    """Contrast window, flips, rotation and the conversion to 8 bit in a single pass.
+
+    Flips and rotation are strided views, the LUT of the stretcher then writes
+    the uint8 display image in the final orientation (one allocation per frame).
+    Uses the settings of the stretcher, flipper and rotator stages given.
+    """
+    def __init__(self, stretcher, flipper, rotator):
+        self.stretcher = stretcher
+        self.flipper = flipper
+        self.rotator = rotator
+
+    def apply(self, img: np.ndarray) -> np.ndarray:
+        if self.flipper.flip_h:
+            img = img[:, ::-1]
+        if self.flipper.flip_v:
+            img = img[::-1]
+        if self.rotator.angle:
+            img = np.rot90(img, k=-self.rotator.angle // 90)  # clockwise
+        if img.dtype not in (np.uint8, np.uint16):
+            # no LUT for other types, scale to 8 bit
+            img = self.stretcher.apply(img) * (255. / self.stretcher.img_depth)
+            return np.ascontiguousarray(np.clip(img, 0, 255).astype(np.uint8))
+        if img.dtype == np.uint8 and self.stretcher.min_percent == 0 and self.stretcher.max_percent == 100:
+            return np.ascontiguousarray(img)
+        return self.stretcher.lut(img.dtype).take(img)
+
+
 class ImageRotator(ProcessingStage):
     """Rotates an image by a multiple of 90 degrees."""
     def __init__(self):
@@ -0,0 +1,159 @@
+import numpy as np
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QImage, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QWidget
+
+
+class ImageView(QWidget):
+    """Camera image view, replaces a QLabel + scaled QPixmap.
+
+    Frames are copied into one QImage backing buffer (reallocated only when the
+    size changes) and the painter scales it at paint time. Wheel zooms around
+    the cursor, left drag pans, double click toggles between fit and native
+    sensor pixels (native_size, the full frame size). An outline (e.g. the pupil
+    fit) can be drawn over the image with set_overlay.
+    """
+    MAX_ZOOM = 64.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setMinimumSize(1, 1)
+        self.keep_aspect_ratio = True
+        self.native_size = None  # (height, width) of the full frame
+        self.zoom = 1.            # relative to fit
+        self._center = QPointF(.5, .5)  # image point at the center of the view, normalized
+        self._buffer = None
+        self._qimg = None
+        self._drag = None
+        self._overlay = None
+
+    # ------------------------------------------------------------------
+    def set_image(self, img):
+        """Copies img (uint8, H x W [x 1|3]) into the backing buffer and repaints"""
+        if img.ndim == 2:
+            img = img[:, :, None]
+        if img.dtype == np.uint16:
+            img = (img >> 8).astype(np.uint8)
+        if self._buffer is None or self._buffer.shape != img.shape:
+            height, width, n_chan = img.shape
+            self._buffer = np.empty(img.shape, dtype=np.uint8)
+            fmt = QImage.Format_Grayscale8 if n_chan == 1 else QImage.Format_RGB888
+            # the QImage only wraps the numpy buffer, keep both alive together
+            self._qimg = QImage(self._buffer.data, width, height, n_chan * width, fmt)
+        np.copyto(self._buffer, img, casting='unsafe')
+        self.update()
+
+    def clear(self):
+        self._buffer = None
+        self._qimg = None
+        self._overlay = None
+        self.update()
+
+    def set_overlay(self, points):
+        """Closed outline drawn over the image, n x 2 (x, y) normalized to the
+        displayed image (0-1), None removes it. Repainted with the next image."""
+        self._overlay = points
+
+    def preview_size(self):
+        """Frame size worth sending to the view: the widget size, magnified by the zoom"""
+        return int(self.height() * self.zoom), int(self.width() * self.zoom)
+
+    def reset_zoom(self):
+        self.zoom = 1.
+        self._center = QPointF(.5, .5)
+        self.update()
+
+    # ------------------------------------------------------------------
+    def _fit_size(self):
+        height, width = self._buffer.shape[:2]
+        if not self.keep_aspect_ratio:
+            return self.width(), self.height()
+        scale = min(self.width() / width, self.height() / height)
+        return width * scale, height * scale
+
+    def _target_rect(self):
+        fit_w, fit_h = self._fit_size()
+        w, h = fit_w * self.zoom, fit_h * self.zoom
+        return QRectF(self.width() / 2 - self._center.x() * w,
+                      self.height() / 2 - self._center.y() * h, w, h)
+
+    def _set_zoom(self, zoom, anchor):
+        """Zoom keeping the image point under anchor (widget coordinates) in place"""
+        if self._buffer is None:
+            return
+        zoom = min(max(zoom, 1.), self.MAX_ZOOM)
+        rect = self._target_rect()
+        u = (anchor.x() - rect.x()) / rect.width()
+        v = (anchor.y() - rect.y()) / rect.height()
+        self.zoom = zoom
+        fit_w, fit_h = self._fit_size()
+        w, h = fit_w * zoom, fit_h * zoom
+        self._center = QPointF((self.width() / 2 - anchor.x()) / w + u,
+                               (self.height() / 2 - anchor.y()) / h + v)
+        self._clamp_center()
+        self.update()
+
+    def _clamp_center(self):
+        if self.zoom <= 1.:
+            self._center = QPointF(.5, .5)
+            return
+        half = .5 / self.zoom
+        self._center = QPointF(min(max(self._center.x(), half), 1 - half),
+                               min(max(self._center.y(), half), 1 - half))
+
+    # ------------------------------------------------------------------
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+        if self._qimg is not None:
+            # nearest neighbour, native pixels stay sharp when zoomed
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+            painter.drawImage(self._target_rect(), self._qimg)
+            if self._overlay is not None:
+                self._paint_overlay(painter)
+        painter.end()
+
+    def _paint_overlay(self, painter):
+        rect = self._target_rect()
+        pen = QPen(Qt.green)
+        pen.setWidthF(1.5)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.drawPolygon(QPolygonF([QPointF(rect.x() + u * rect.width(), rect.y() + v * rect.height())
+                                       for u, v in self._overlay]))
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120.
+        self._set_zoom(self.zoom * 1.25 ** steps, event.pos())
+
+    def mouseDoubleClickEvent(self, event):
+        if self._buffer is None:
+            return
+        if self.zoom > 1.:
+            self.reset_zoom()
+            return
+        # one sensor pixel per screen pixel
+        native_w = self.native_size[1] if self.native_size else self._buffer.shape[1]
+        self._set_zoom(native_w / self._fit_size()[0], event.pos())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.zoom > 1.:
+            self._drag = event.pos()
+            self.setCursor(Qt.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self._drag is None:
+            return
+        rect = self._target_rect()
+        delta = event.pos() - self._drag
+        self._drag = event.pos()
+        self._center = QPointF(self._center.x() - delta.x() / rect.width(),
+                               self._center.y() - delta.y() / rect.height())
+        self._clamp_center()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self._drag = None
+        self.unsetCursor()
@@ -1,12 +1,12 @@
 import os
+import time
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog, QMessageBox, QProgressBar
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from neucams.view.widgets import PyCamsWindow
-from neucams.utils import get_preferences, display, check_preferences, resolve_cam_id_by_serial
-from neucams.camera_handler import CameraHandler, CameraFactory
+from neucams.utils import get_preferences, display, check_preferences, resolve_cam_id_by_serial, get_user_config_dir
+from neucams.camera_handler import CameraFactory, init_cam_handlers
 from pathlib import Path
 import logging
-import platform
 # Set global logging to INFO so neucams info messages show
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 # Suppress info messages from vmbpy
@@ -18,14 +18,6 @@ logging.getLogger('vmbpy').setLevel(logging.WARNING)
 PROJECT_ROOT = str(Path(__file__).parent.parent.parent)
 CONFIG_DIR = os.path.join(PROJECT_ROOT, 'neucams', 'jsonfiles')
 
-def get_user_config_dir():
-    if platform.system() == "Windows":
-        base = os.getenv('LOCALAPPDATA', os.path.expanduser('~'))
-        return os.path.join(base, "NeuCams")
-    else:
-        base = os.getenv('XDG_CONFIG_HOME', os.path.expanduser('~/.config'))
-        return os.path.join(base, "NeuCams")
-
 USER_CONFIG_DIR = get_user_config_dir()
 os.makedirs(USER_CONFIG_DIR, exist_ok=True)
 
@@ -58,9 +50,20 @@ def load_last_config():
 # QThread for background loading (heavy camera setup)
 class CameraSetupWorker(QThread):
     finished = pyqtSignal(object, object, object, str)  # (ret, prefs, cam_handlers, error_message)
+    cam_ready = pyqtSignal(str, str)  # (description, status text), as each camera completes
     def __init__(self, config_path):
         super().__init__()
         self.config_path = config_path
+
+    def _report(self, cam, cam_handler, seconds):
+        description = cam.get('description', '?')
+        if cam_handler is None or not cam_handler.camera_connected:
+            self.cam_ready.emit(description, f"not connected ({seconds:.2f} s)")
+            return
+        steps = ', '.join(f"{k} {v:.2f}" for k, v in cam_handler.init_times.items())
+        cached = ' cached' if cam_handler.format_cached else ''
+        self.cam_ready.emit(description, f"ready in {seconds:.2f} s ({steps}{cached})")
+
     def run(self):
         ret, prefs = get_preferences(self.config_path)
         error_message = ""
@@ -75,12 +78,8 @@ class CameraSetupWorker(QThread):
             if error_message:
                 self.finished.emit(False, prefs, [], error_message)
                 return
-            for cam in prefs.get('cams', []):
-                if cam.get('driver', '').lower() in valid_drivers:
-                    writer_dict = {**prefs.get('recorder_params', {}), **cam.get('recorder_params', {})}
-                    cam_handler = CameraHandler(cam, writer_dict)
-                    if cam_handler.camera_connected:
-                        cam_handlers.append((cam, cam_handler))
+            cams = [cam for cam in prefs.get('cams', []) if cam.get('driver', '').lower() in valid_drivers]
+            cam_handlers = init_cam_handlers(cams, prefs, on_ready=self._report)
         self.finished.emit(ret, prefs, cam_handlers, error_message)
 
 # Splash/launcher window
@@ -88,7 +87,7 @@ class SplashWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle('NeuCams Launcher')
-        self.setFixedSize(400, 320)
+        self.setFixedSize(400, 420)
         layout = QVBoxLayout()
         layout.setAlignment(Qt.AlignCenter)
         title = QLabel('NeuCams')
@@ -117,6 +116,13 @@ class SplashWindow(QWidget):
         self.progress_bar.setTextVisible(False)
         self.progress_bar.hide()
         layout.addWidget(self.progress_bar)
+        # per camera readiness and init timing
+        self.cams_label = QLabel('')
+        self.cams_label.setAlignment(Qt.AlignLeft)
+        self.cams_label.setWordWrap(True)
+        self.cams_label.setStyleSheet('font-size: 11px; color: #333;')
+        layout.addWidget(self.cams_label)
+        self.cam_status = {}
         self.setLayout(layout)
         self.worker_thread = None
         self.main_window = None
@@ -141,6 +147,7 @@ class SplashWindow(QWidget):
         if fname:
             self.start_loading()
             self.worker_thread = CameraSetupWorker(fname)
+            self.worker_thread.cam_ready.connect(self.on_cam_ready)
             self.worker_thread.finished.connect(lambda ret, prefs, cam_handlers, error_message: self.on_loaded(ret, prefs, cam_handlers, error_message, fname))
             self.worker_thread.start()
             self.update_last_config_label()
@@ -150,6 +157,7 @@ class SplashWindow(QWidget):
         if last and os.path.isfile(last):
             self.start_loading()
             self.worker_thread = CameraSetupWorker(last)
+            self.worker_thread.cam_ready.connect(self.on_cam_ready)
             self.worker_thread.finished.connect(lambda ret, prefs, cam_handlers, error_message: self.on_loaded(ret, prefs, cam_handlers, error_message, last))
             self.worker_thread.start()
         else:
@@ -161,6 +169,15 @@ class SplashWindow(QWidget):
         self.last_btn.setEnabled(False)
         self.loading_label.show()
         self.progress_bar.show()
+        self.cam_status = {}
+        self.cams_label.setText('')
+        self._t_loading = time.perf_counter()
+
+    def on_cam_ready(self, description, status):
+        self.cam_status[description] = status
+        lines = [f"<b>{d}</b>: {s}" for d, s in self.cam_status.items()]
+        lines.append(f"elapsed {time.perf_counter() - self._t_loading:.2f} s")
+        self.cams_label.setText('<br>'.join(lines))
 
     def stop_loading(self):
         self.choose_btn.setEnabled(True)
@@ -0,0 +1,183 @@
+import time
+import threading
+from multiprocessing.connection import wait
+
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+from neucams.utils import display
+
+
+class FrameNotifier(QThread):
+    """Waits on the preview pipes of all the handlers and emits the index of the
+    camera that has a new preview. Blocks (no polling) while no frames arrive."""
+    frame_ready = pyqtSignal(int)
+
+    def __init__(self):
+        super().__init__()
+        self._handlers = {}  # connection -> (index, handler)
+        self._running = True
+
+    def add(self, index, cam_handler):
+        self._handlers[cam_handler.preview_ready_conn] = (index, cam_handler)
+
+    def run(self):
+        while self._running:
+            conns = list(self._handlers)
+            if not conns:
+                self.msleep(100)
+                continue
+            for conn in wait(conns, timeout=0.2):
+                index, cam_handler = self._handlers[conn]
+                try:
+                    cam_handler.ack_preview()
+                except (EOFError, OSError):
+                    # handler gone, stop watching it
+                    self._handlers.pop(conn, None)
+                    continue
+                self.frame_ready.emit(index)
+
+    def stop(self):
+        self._running = False
+        self.wait(1000)
+
+
+class ProcessingWorker(QThread):
+    """Runs the display processing of one camera widget off the GUI thread.
+
+    submit() replaces the frame waiting to be processed (frames coalesce when the
+    worker falls behind, n_coalesced counts them), processed is emitted when a
+    result is ready and take() returns the newest one.
+    """
+    processed = pyqtSignal()
+
+    def __init__(self, process):
+        super().__init__()
+        self._process = process
+        self._cond = threading.Condition()
+        self._pending = None
+        self._result = None
+        self._running = True
+        self.n_coalesced = 0
+
+    def submit(self, img):
+        with self._cond:
+            if self._pending is not None:
+                self.n_coalesced += 1
+            self._pending = img
+            self._cond.notify()
+
+    def take(self):
+        with self._cond:
+            result, self._result = self._result, None
+        return result
+
+    def run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                img, self._pending = self._pending, None
+            try:
+                result = self._process(img)
+            except Exception as e:
+                display(f"Display processing failed: {e}", level='warning')
+                continue
+            with self._cond:
+                notify = self._result is None  # one signal queued at a time
+                self._result = result
+            if notify:
+                self.processed.emit()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait(1000)
+
+
+class DisplayScheduler(QObject):
+    """Single refresh loop for all the camera widgets, driven by new frames.
+
+    The focused camera is drawn at up to the monitor refresh rate and the
+    other ones at background_fps. Labels (filepath, fps, start/stop) follow the
+    draws, at most every status_interval ms; the handlers also notify when a run
+    ends, so nothing runs (no timer) while no frames come.
+    """
+    def __init__(self, parent=None, focused=None, background_fps=10., status_interval=500):
+        super().__init__(parent)
+        self.widgets = []
+        self.focused = focused  # callable returning the focused widget, or None
+        self.background_fps = float(background_fps)
+        screen = QApplication.primaryScreen()
+        self.refresh_rate = screen.refreshRate() if screen is not None else 60.
+        self.refresh_rate = self.refresh_rate if self.refresh_rate > 0 else 60.
+        self.status_interval = status_interval / 1000.
+        self._last_draw = []
+        self._last_status = []
+        self._dirty = set()
+        self._status_dirty = set()
+        self._next_due = None  # when the single shot timer fires
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._draw)
+
+        self.notifier = FrameNotifier()
+        self.notifier.frame_ready.connect(self._on_frame)
+        self.notifier.start()
+        display(f"Display refresh: {self.refresh_rate:.0f} Hz focused, {self.background_fps:.0f} Hz background")
+
+    def add(self, widget):
+        index = len(self.widgets)
+        self.widgets.append(widget)
+        self._last_draw.append(0.)
+        self._last_status.append(0.)
+        if widget.cam_handler is not None:
+            self.notifier.add(index, widget.cam_handler)
+
+    def stop(self):
+        self._timer.stop()
+        self.notifier.stop()
+
+    def _period(self, widget):
+        focused = self.focused() if self.focused is not None else None
+        if focused is None or focused is widget:
+            return 1. / self.refresh_rate
+        return 1. / self.background_fps if self.background_fps > 0 else 0.
+
+    def _on_frame(self, index):
+        self._dirty.add(index)
+        # the timer can be waiting for a label update, a frame due earlier goes first
+        due = self._last_draw[index] + self._period(self.widgets[index])
+        if not self._timer.isActive() or due < self._next_due:
+            self._draw()
+
+    def _draw(self):
+        now = time.perf_counter()
+        next_due = None
+        for index in list(self._dirty):
+            widget = self.widgets[index]
+            due = self._last_draw[index] + self._period(widget)
+            if due <= now:
+                self._dirty.discard(index)
+                self._last_draw[index] = now
+                widget._update()
+                self._status_dirty.add(index)
+            elif next_due is None or due < next_due:
+                next_due = due
+        # labels after the draw, a last update is kept for when the frames stop
+        for index in list(self._status_dirty):
+            due = self._last_status[index] + self.status_interval
+            if due <= now:
+                self._status_dirty.discard(index)
+                self._last_status[index] = now
+                self.widgets[index]._update_status()
+            elif next_due is None or due < next_due:
+                next_due = due
+        self._next_due = next_due
+        if next_due is not None:
+            self._timer.start(max(1, int((next_due - time.perf_counter()) * 1000)))
+        else:
+            self._timer.stop()
@@ -8,7 +8,7 @@ import logging
 
 import numpy as np
 from PyQt5 import uic
-from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QAction, QApplication, QMainWindow, QMessageBox,
                              QMdiSubWindow, QWidget)
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
@@ -19,10 +19,12 @@ from .image_processing import (HistogramStretcher, ImageFlipper,
 from neucams.udp_socket import UDPSocket
 from neucams.utils import display
 from neucams.camera_handler import CameraHandler
+from neucams.tracking import init_tracker, ellipse_points
 
 # Re-use the existing CamWidget implementation (and its helpers) from the legacy GUI.
 from neucams.view.components import DisplaySettingsWidget, ImageProcessingWidget
-from neucams.view.base_widgets import BaseCameraWidget, nparray_to_qimg
+from neucams.view.base_widgets import BaseCameraWidget
+from neucams.view.scheduler import DisplayScheduler, ProcessingWorker
 
 # -----------------------------------------------------------------------------
 # Shared-memory helper (avoid importing AVT driver unless actually needed)
@@ -88,15 +90,22 @@ class PyCamsWindow(QMainWindow):
         # Camera widgets setup (logic copied from legacy implementation)
         # ------------------------------------------------------------------
         self.cam_widgets = []
+        # one frame-driven refresh loop for all the camera widgets
+        self.display_scheduler = DisplayScheduler(self, focused=self._focused_cam_widget,
+                                                  background_fps=self.preferences.get('display_background_fps', 10))
         if preinit_cam_handlers is not None:
             for cam, cam_handler in preinit_cam_handlers:
+                tracker = init_tracker(cam_handler)
                 cam_handler.start()
-                widget = CamWidget(cam_handler)
+                if tracker is not None:
+                    tracker.start()
+                widget = CamWidget(cam_handler, tracker)
                 self.cam_widgets.append(widget)
+                self.display_scheduler.add(widget)
                 self._add_widget(cam.get('description'), widget)
         else:
             for cam in self.preferences.get('cams', []):
-                if cam.get('driver') in ['avt', 'pco', 'genicam', 'hamamatsu']:
+                if cam.get('driver') in ['avt', 'pco', 'genicam', 'hamamatsu', 'opencv', 'sim', 'replay']:
                     self._setup_camera(cam)
 
         # Arrange the camera windows in a grid
@@ -135,15 +144,23 @@ class PyCamsWindow(QMainWindow):
         writer_dict = {**self.preferences.get('recorder_params', {}),
                     **cam_dict.get('recorder_params', {})}
         cam_handler = CameraHandler(cam_dict, writer_dict)
+        tracker = init_tracker(cam_handler) if cam_handler.camera_connected else None
         cam_handler.start()  # <-- start the process
+        if tracker is not None:
+            tracker.start()
         if cam_handler.camera_connected:
-            widget = CamWidget(cam_handler)
+            widget = CamWidget(cam_handler, tracker)
             self.cam_widgets.append(widget)
+            self.display_scheduler.add(widget)
             self._add_widget(cam_dict.get('description', 'Camera'), widget)  # pass widget
         else:
             cam_handler.close()
 
 
+    def _focused_cam_widget(self):
+        subwindow = self.mdiArea.activeSubWindow()
+        return subwindow.widget() if subwindow is not None else None
+
     def _add_widget(self, name, widget):
         active_subwindows = [e.objectName() for e in self.mdiArea.subWindowList()]
         if name not in active_subwindows:
@@ -244,17 +261,24 @@ class PyCamsWindow(QMainWindow):
             event.ignore()
 
     def close(self):
+        self.display_scheduler.stop()
+        for cam_widget in self.cam_widgets:
+            cam_widget.stop_processing()
         for cam_widget in self.cam_widgets:
             cam_widget.cam_handler.close()
+        for cam_widget in self.cam_widgets:
+            if cam_widget.tracker is not None:
+                cam_widget.tracker.close()
         time.sleep(0.5)
         display("PyCams out, bye!")
         QApplication.quit()
         sys.exit()
 
 class CamWidget(BaseCameraWidget):
-    def __init__(self, cam_handler=None):
+    def __init__(self, cam_handler=None, tracker=None):
         super().__init__(cam_handler)
         uic.loadUi(join(dirpath, 'UI_cam.ui'), self)
+        self.tracker = tracker  # neucams.tracking.PupilTracker, fit drawn over the image
 
         # --- Initialize state ---
         self.original_img = None
@@ -280,12 +304,18 @@ class CamWidget(BaseCameraWidget):
             pipeline.stages.insert(0, self.img_processing_settings.bg_subtract_stage)
             pipeline.stages.insert(0, self.img_processing_settings.blur_stage)
 
+        # --- Display processing thread, the GUI thread only paints ---
+        self.processing_worker = ProcessingWorker(self.display_settings.process_img)
+        self.processing_worker.processed.connect(self._show_processed)
+        self.display_settings.changed.connect(self._reprocess)
+        self.processing_worker.start()
+
     def _update(self):
+        """New preview from the handler"""
         if self.cam_handler is None:
             return
-        dest = self.cam_handler.get_filepath()
-        self.save_location_label.setText('Filepath: ' + dest)
-        if self.frame_nr != self.cam_handler.total_frames.value:
+        self._update_preview_size()
+        if self.frame_nr != self.cam_handler.preview_frames.value:
             img = self.cam_handler.get_image()
             if isinstance(img, tuple) and len(img) == 3 and isinstance(img[0], str):
                 shm_name, shape, dtype = img
@@ -294,17 +324,29 @@ class CamWidget(BaseCameraWidget):
                 shm.close()
                 shm.unlink()
             self.original_img = np.copy(img)
-            self.is_img_processed = False
-            self.frame_nr = self.cam_handler.total_frames.value
+            self.frame_nr = self.cam_handler.preview_frames.value
+            self._update_img()
+
+    def _update_status(self):
+        if self.cam_handler is None:
+            return
+        dest = self.cam_handler.get_filepath()
+        self.save_location_label.setText('Filepath: ' + dest)
         self._update_stats()
         if self.cam_handler.start_trigger.is_set() and not self.cam_handler.stop_trigger.is_set():
             self._set_stop_text()
         else:
             self._set_start_text()
-        if self.display_settings.isVisible():
-            self.is_img_processed = False
-        self._update_img()
-        super().update()
+
+    def _update_preview_size(self):
+        # the handler only sends what the view shows (rotated frames are shown transposed)
+        height, width = self.img_view.preview_size()
+        native = tuple(self.cam_handler.full_frame_shape[:])
+        if self.display_settings.rotator.angle in (90, 270):
+            height, width = width, height
+            native = native[::-1]
+        self.cam_handler.set_preview_size(height, width)
+        self.img_view.native_size = native
 
     def _update_stats(self):
         current_time = time.time()
@@ -325,13 +367,47 @@ class CamWidget(BaseCameraWidget):
             return
             
         if self.original_img is not None and self.original_img.size > 0:
-            if not self.is_img_processed:
-                self.processed_img = self.display_settings.process_img(self.original_img)
-                self.is_img_processed = True
-            pixmap = QPixmap(nparray_to_qimg(self.processed_img))
-            pixmap = pixmap.scaled(self.img_label.width(), self.img_label.height(),
-                                   self.AR_policy, Qt.FastTransformation)
-            self.img_label.setPixmap(pixmap)
+            self.processing_worker.submit(self.original_img)
+
+    def _reprocess(self):
+        # settings changed, also when the camera is stopped
+        if self.original_img is not None and self.original_img.size > 0:
+            self.processing_worker.submit(self.original_img)
+
+    def _show_processed(self):
+        img = self.processing_worker.take()
+        if img is None:
+            return
+        self.processed_img = img
+        if self.tracker is not None:
+            self._update_overlay()
+        self.img_view.set_image(img)
+        self.display_settings.update_histogram_plot()
+
+    def _update_overlay(self):
+        """Outline of the last pupil fit, in the flipped / rotated view"""
+        fit = self.tracker.last_fit()
+        height, width = self.cam_handler.full_frame_shape[:]
+        if fit is None or not height or not width:
+            self.img_view.set_overlay(None)
+            return
+        points = ellipse_points(*fit[1:])
+        u, v = points[:, 0] / width, points[:, 1] / height
+        flipper, angle = self.display_settings.flipper, self.display_settings.rotator.angle
+        if flipper.flip_h:
+            u = 1 - u
+        if flipper.flip_v:
+            v = 1 - v
+        if angle == 90:  # clockwise
+            u, v = 1 - v, u
+        elif angle == 180:
+            u, v = 1 - u, 1 - v
+        elif angle == 270:
+            u, v = v, 1 - u
+        self.img_view.set_overlay(np.column_stack([u, v]))
+
+    def stop_processing(self):
+        self.processing_worker.stop()
 
     def _start_stop_toggled(self, checked):
         if checked:
@@ -0,0 +1,41 @@
+import numpy as np
+
+from neucams.hooks import FrameHook
+
+
+class Collector:
+    """Hook keeping the shape and ids of every batch it is called with"""
+    calls = []
+
+    def __init__(self):
+        Collector.calls = []
+
+    def __call__(self, frames, frame_ids, timestamps):
+        Collector.calls.append((frames.shape, frames.dtype, list(frame_ids)))
+
+
+def _push_formats(workers):
+    hook = FrameHook({'function': f'{__name__}:Collector', 'batch': 4, 'workers': workers})
+    frame_id = 0
+    for shape, dtype in (((10, 10), np.uint8), ((5, 5), np.uint8), ((5, 5), np.uint16), ((10, 10, 3), np.uint8)):
+        for _ in range(3):
+            hook.push(np.full(shape, frame_id, dtype=dtype), (frame_id, frame_id * 0.01))
+            frame_id += 1
+    stats = hook.stats()
+    hook.close()
+    return stats
+
+
+def test_format_change_inline():
+    stats = _push_formats(workers=0)
+    assert stats['errors'] == 0
+    assert [c[0] for c in Collector.calls] == [(3, 10, 10, 1), (3, 5, 5, 1), (3, 5, 5, 1), (3, 10, 10, 3)]
+    assert [c[1] for c in Collector.calls] == [np.uint8, np.uint8, np.uint16, np.uint8]
+    assert sum((c[2] for c in Collector.calls), []) == list(range(12))
+
+
+def test_format_change_pool():
+    stats = _push_formats(workers=4)  # room for every batch, none dropped
+    assert stats['errors'] == 0 and stats['dropped'] == 0
+    assert sorted(c[0] for c in Collector.calls) == sorted([(3, 10, 10, 1), (3, 5, 5, 1), (3, 5, 5, 1), (3, 10, 10, 3)])
+    assert sorted(sum((c[2] for c in Collector.calls), [])) == list(range(12))